@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Stand-in call servers for trying call-provider failover (pi/call_providers.py) locally.
+
+Starts a primary and a fallback "call room" server on localhost and prints the config
+that points a DogPhone at them. --flap takes the primary down and up again every N
+seconds; --demo also runs a CallRouter in this process and prints where a press
+would go each second:
+
+  python bench/call_standin.py --demo --flap 15 --check-secs 3
+
+Without --demo, put the printed lines in config/config.env and run pi/main.py
+(Test call on the status page shows which room opens).
+"""
+import argparse
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+PI_DIR = Path(__file__).resolve().parent.parent / "pi"
+
+
+class StandInServer:
+    """One call room server that can be taken down (connection refused) and brought back."""
+
+    def __init__(self, name: str, port: int):
+        self.name = name
+        self.port = port
+        self._srv = None
+
+    @property
+    def base(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def _handler(self):
+        body = f"<h1>{self.name} call room</h1>".encode()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+
+            def do_GET(self):
+                self.do_HEAD()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def up(self) -> None:
+        if self._srv is None:
+            self._srv = ThreadingHTTPServer(("127.0.0.1", self.port), self._handler())
+            self._srv.daemon_threads = True
+            threading.Thread(target=self._srv.serve_forever, daemon=True).start()
+            print(f"{self.name} up on {self.base}")
+
+    def down(self) -> None:
+        if self._srv is not None:
+            self._srv.shutdown()
+            self._srv.server_close()
+            self._srv = None
+            print(f"{self.name} down")
+
+    @property
+    def is_up(self) -> bool:
+        return self._srv is not None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run stand-in primary/fallback call servers.")
+    parser.add_argument("--primary-port", type=int, default=9301)
+    parser.add_argument("--fallback-port", type=int, default=9302)
+    parser.add_argument("--flap", type=float, default=0, help="Toggle the primary every N seconds (0 = stay up)")
+    parser.add_argument("--primary-down", action="store_true", help="Start with the primary down")
+    parser.add_argument("--demo", action="store_true", help="Run a CallRouter here and print where presses go")
+    parser.add_argument("--check-secs", type=float, default=3.0, help="PROVIDER_CHECK_SECS for --demo")
+    args = parser.parse_args()
+
+    primary = StandInServer("primary", args.primary_port)
+    fallback = StandInServer("fallback", args.fallback_port)
+    fallback.up()
+    if not args.primary_down:
+        primary.up()
+
+    cfg = {
+        "video_call_url": "local:dogphone",
+        "local_call_base": primary.base,
+        "video_call_fallback_url": f"{fallback.base}/dogphone",
+        "provider_check_secs": args.check_secs,
+    }
+    print("Config for config/config.env:")
+    print(f"  VIDEO_CALL_URL={cfg['video_call_url']}")
+    print(f"  LOCAL_CALL_BASE={cfg['local_call_base']}")
+    print(f"  VIDEO_CALL_FALLBACK_URL={cfg['video_call_fallback_url']}")
+    print(f"  PROVIDER_CHECK_SECS={args.check_secs:g}")
+
+    router = None
+    if args.demo:
+        sys.path.insert(0, str(PI_DIR))
+        from call_providers import get_router
+        router = get_router(cfg)
+
+    started = time.monotonic()
+    next_flap = started + args.flap if args.flap else None
+    try:
+        while True:
+            time.sleep(1)
+            now = time.monotonic()
+            if next_flap is not None and now >= next_flap:
+                primary.down() if primary.is_up else primary.up()
+                next_flap = now + args.flap
+            if router is not None:
+                url = router.launch_url()
+                which = "fallback" if url == router.fallback[1] else "primary"
+                state = "up" if primary.is_up else "down"
+                print(f"{now - started:6.0f}s  primary {state:4}  press -> {which} ({url})")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        primary.down()
+        fallback.down()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+DogPhone HTTP load test / latency benchmark for all three servers.
+
+Starts each Flask app in this process with side effects stubbed:
+- main.py (/, /trigger-call, /dispense): fake browser launcher, fake GPIO, no servo hold
+- launcher status server (/, /api/main-up)
+- setup_server.py (/api/status, /api/video_url, /api/wifi, /api/update): fake nmcli, git,
+  sudo, hostname and ip on PATH; config written to a temp dir
+The "has internet" probe and the call-provider health checks go to a local stand-in
+server (INTERNET_PROBE_URL; VIDEO_CALL_URL is a "local:" room under it), so a run
+sends nothing off the machine.
+
+Reports requests/s, p50/p95/p99 latency and process RSS per endpoint. Save a baseline
+on a known-good build and compare later runs against it:
+  python bench/http_bench.py --save-baseline
+  python bench/http_bench.py --concurrency 8 --requests 500
+  python bench/http_bench.py --only setup --fail-on-regression
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+PI_DIR = BENCH_DIR.parent / "pi"
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+
+# (server, method, path, JSON body)
+SCENARIOS = [
+    ("main", "GET", "/", None),
+    ("main", "GET", "/trigger-call", None),
+    ("main", "GET", "/dispense", None),
+    ("status", "GET", "/", None),
+    ("status", "GET", "/api/main-up", None),
+    ("setup", "GET", "/api/status", None),
+    ("setup", "POST", "/api/video_url", {"video_call_url": "123456789", "video_call_password": "bench"}),
+    ("setup", "POST", "/api/wifi", {"ssid": "BenchNet", "password": "bench"}),
+    ("setup", "POST", "/api/update", {}),
+]
+
+# Stand-ins for the commands the servers shell out to
+FAKE_COMMANDS = {
+    "nmcli": "exit 0",
+    "sudo": "exit 0",
+    "git": 'echo "Already up to date."',
+    "hostname": 'echo "127.0.0.1"',
+    "ip": 'echo "2: wlan0    inet 10.42.0.1/24 brd 10.42.0.255 scope global wlan0"',
+    "xset": "exit 0",
+}
+
+
+class FakeGPIO:
+    """Just enough of RPi.GPIO for run_servo_once."""
+    BCM = OUT = IN = PUD_UP = FALLING = 0
+
+    class PWM:
+        def __init__(self, pin, freq):
+            pass
+
+        def start(self, duty):
+            pass
+
+        def ChangeDutyCycle(self, duty):
+            pass
+
+        def stop(self):
+            pass
+
+    @staticmethod
+    def setmode(mode):
+        pass
+
+    @staticmethod
+    def setwarnings(flag):
+        pass
+
+    @staticmethod
+    def setup(pin, mode, **kwargs):
+        pass
+
+
+class _ProbeHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.do_HEAD()
+        self.wfile.write(b"ok")
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def start_probe_server() -> str:
+    """Local stand-in for the internet probe (api.telegram.org) and the call host. Returns its URL."""
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _ProbeHandler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{srv.server_port}/"
+
+
+def install_fake_commands(bin_dir: Path) -> None:
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    for name, body in FAKE_COMMANDS.items():
+        p = bin_dir / name
+        p.write_text(f"#!/bin/sh\n{body}\n")
+        p.chmod(0o755)
+    os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
+
+
+def serve_in_thread(app):
+    """Run a Flask app on a free localhost port in a daemon thread. Returns the port."""
+    from werkzeug.serving import make_server
+    srv = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv.server_port
+
+
+def start_servers(tmp: Path) -> dict:
+    """Import and start the three apps with side effects stubbed. Returns {server: port}."""
+    install_fake_commands(tmp / "bin")
+    probe_url = start_probe_server()
+    # Set explicitly: values from a developer's config.env must not point the run at real hosts
+    os.environ["INTERNET_PROBE_URL"] = probe_url
+    os.environ["LOCAL_CALL_BASE"] = probe_url
+    os.environ["VIDEO_CALL_URL"] = "local:bench-room"
+    os.environ["VIDEO_CALL_FALLBACK_URL"] = "local:bench-fallback"
+    sys.path.insert(0, str(PI_DIR))
+
+    import main
+    import launcher
+    import setup_server
+    from config import load_config
+
+    for name in ("werkzeug", "dogphone", "setup"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    launches = []
+    main.open_video_call_in_browser = launches.append
+    main.HAS_GPIO = True
+    main.GPIO = FakeGPIO
+    main.SERVO_HOLD_SECS = 0
+    launcher.open_browser = launches.append
+    setup_server.CONFIG_FILE = tmp / "config" / "config.env"
+
+    ports = {}
+    ports["main"] = serve_in_thread(main.create_app(load_config()))
+    launcher.MAIN_PORT = ports["main"]
+    ports["status"] = serve_in_thread(launcher.create_status_app())
+    ports["setup"] = serve_in_thread(setup_server.create_app())
+    return ports
+
+
+def rss_kb() -> int:
+    """Resident set size of this process (servers + load generator) in KiB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def run_load(port: int, method: str, path: str, body, concurrency: int, total: int) -> dict:
+    """Send total requests with concurrency workers. One connection per request (dev server is HTTP/1.0)."""
+    payload = json.dumps(body).encode() if body is not None else None
+    headers = {"Content-Type": "application/json"} if payload is not None else {}
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    remaining = [total]
+
+    def worker():
+        mine = []
+        failed = 0
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            t0 = time.perf_counter()
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                conn.request(method, path, body=payload, headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+                conn.close()
+                if resp.status >= 500:
+                    failed += 1
+            except Exception:
+                failed += 1
+            mine.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors[0],
+        "rps": total / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "rss_kb": rss_kb(),
+    }
+
+
+def compare(result: dict, base: dict, tolerance: float) -> list:
+    """Return human-readable regressions of result vs baseline (empty if none)."""
+    problems = []
+    if base.get("rps") and result["rps"] < base["rps"] * (1 - tolerance):
+        problems.append(f"rps {result['rps']:.0f} < {base['rps']:.0f}")
+    for key in ("p95_ms", "p99_ms"):
+        if base.get(key) and result[key] > base[key] * (1 + tolerance):
+            problems.append(f"{key} {result[key]:.1f} > {base[key]:.1f}")
+    if result["errors"] > base.get("errors", 0):
+        problems.append(f"errors {result['errors']}")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load-test the DogPhone HTTP servers in-process.")
+    parser.add_argument("--concurrency", default="1,8", help="Comma-separated worker counts (default: 1,8)")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint per concurrency level")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed requests per endpoint first")
+    parser.add_argument("--only", help="Only servers/paths containing this (e.g. setup, /api/status)")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Write results to --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit 1 if any endpoint regressed")
+    parser.add_argument("--json", type=Path, help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    baseline = {}
+    if args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text()).get("results", {})
+
+    results = {}
+    regressed = False
+    with tempfile.TemporaryDirectory(prefix="dogphone-bench-") as tmp:
+        ports = start_servers(Path(tmp))
+        print(f"{'endpoint':34} {'conc':>4} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'RSS MiB':>8}  err")
+        for server, method, path, body in SCENARIOS:
+            name = f"{server} {method} {path}"
+            if args.only and args.only not in name:
+                continue
+            if args.warmup:
+                run_load(ports[server], method, path, body, 1, args.warmup)
+            for conc in levels:
+                key = f"{name} c{conc}"
+                r = run_load(ports[server], method, path, body, conc, args.requests)
+                results[key] = r
+                line = (
+                    f"{name:34} {conc:>4} {r['rps']:>8.0f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+                    f"{r['p99_ms']:>8.2f} {r['rss_kb'] / 1024:>8.1f}  {r['errors']}"
+                )
+                if key in baseline:
+                    problems = compare(r, baseline[key], args.tolerance)
+                    if problems:
+                        regressed = True
+                        line += "  REGRESSION: " + ", ".join(problems)
+                print(line, flush=True)
+
+    doc = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "requests": args.requests,
+        "results": results,
+    }
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(doc, indent=2) + "\n")
+        print(f"Saved baseline: {args.baseline}")
+    if args.json:
+        args.json.write_text(json.dumps(doc, indent=2) + "\n")
+    if regressed and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
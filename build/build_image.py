@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+DogPhone reproducible image build: app bundle + rootfs overlay from pi/.
+
+Two steps:
+  1. vendor (needs network, run once per lock change): download pinned wheels for the Pi
+     into build/wheels/ (PyPI; piwheels as extra index for 32-bit armv7l images).
+       python build/build_image.py vendor
+  2. build (offline): unpack wheels, copy pi/, precompile bytecode, write the overlay.
+       python build/build_image.py build [--sourceless] [--zip-deps]
+
+Output (build/out/):
+  overlay/                      files to copy onto the Pi's root filesystem
+    opt/dogphone/app/           pi/ with precompiled __pycache__ (checked-hash .pyc, so on-device edits apply)
+    opt/dogphone/lib/           pinned dependencies (site-packages/, optional deps.zip; unchecked-hash .pyc)
+    opt/dogphone/bin/dogphone   launcher wrapper (PYTHONPATH, no lazy .pyc writes)
+    etc/systemd/system/dogphone.service, etc/xdg/autostart/dogphone.desktop
+  dogphone-overlay-<version>.tar.gz   same, as a reproducible tarball (extract at /)
+  build-report.json             bundle size and measured boot time (entry scripts + imports)
+
+RPi.GPIO is not bundled: PyPI has no wheel for it and piwheels has none for aarch64.
+The launcher uses the system python3, so the distro package (python3-rpi.gpio,
+preinstalled on Raspberry Pi OS) is importable after the bundled site-packages.
+
+Bytecode must match the Pi's Python (Raspberry Pi OS Bookworm: 3.11), so run the build
+with that Python, e.g. in the container from build/Dockerfile. Timestamps come from
+SOURCE_DATE_EPOCH (default: last git commit) so identical inputs give identical output.
+"""
+import argparse
+import compileall
+import gzip
+import hashlib
+import io
+import json
+import os
+import py_compile
+import re
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+BUILD_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BUILD_DIR.parent
+PI_DIR = REPO_ROOT / "pi"
+LOCK_FILE = BUILD_DIR / "requirements.lock"
+WHEELS_DIR = BUILD_DIR / "wheels"
+OUT_DIR = BUILD_DIR / "out"
+HISTORY_FILE = BUILD_DIR / "history.jsonl"
+
+INSTALL_ROOT = "/opt/dogphone"
+TARGET_PYTHON = (3, 11)
+# Pi 4/5 on 64-bit Raspberry Pi OS; add linux_armv7l for 32-bit images
+PLATFORMS = ["manylinux_2_28_aarch64", "manylinux_2_17_aarch64", "manylinux2014_aarch64", "linux_aarch64"]
+PIWHEELS = "https://www.piwheels.org/simple"
+
+# pi/ files that are not part of the runtime app
+APP_EXCLUDE = {"install.sh", "install-image.sh", "dogphone.service", "dogphone.desktop", "config.env"}
+# launcher.py and main.py run as scripts, and __main__ is always compiled from source
+# (a .pyc for it is never read), so they are timed as compiles and shipped without pycs.
+ENTRY_SCRIPTS = ("launcher.py", "main.py")
+# What the device loads at boot: both entry scripts plus the modules they import.
+# RPi.GPIO is blocked: off a Pi it raises RuntimeError on import instead of ImportError.
+BOOT_IMPORTS = (
+    "import sys; sys.modules['RPi'] = None; "
+    f"[compile(open(f).read(), f, 'exec') for f in {ENTRY_SCRIPTS!r}]; "
+    "import config, call_providers, action_queue, presence, diagnostics, setup_server, flask, requests"
+)
+
+
+def source_date_epoch() -> int:
+    if os.environ.get("SOURCE_DATE_EPOCH"):
+        return int(os.environ["SOURCE_DATE_EPOCH"])
+    try:
+        out = subprocess.run(
+            ["git", "log", "-1", "--format=%ct"],
+            cwd=REPO_ROOT, capture_output=True, text=True, timeout=10,
+        )
+        return int(out.stdout.strip())
+    except Exception:
+        return 0
+
+
+def read_lock() -> list:
+    """[(name, version)] from requirements.lock."""
+    pins = []
+    for line in LOCK_FILE.read_text().splitlines():
+        line = line.split("#", 1)[0].strip()
+        if "==" in line:
+            name, version = line.split("==", 1)
+            pins.append((name.strip(), version.strip()))
+    return pins
+
+
+def _norm(name: str) -> str:
+    return re.sub(r"[-_.]+", "_", name).lower()
+
+
+def wheels_for(name: str, version: str) -> list:
+    return [
+        whl for whl in sorted(WHEELS_DIR.glob("*.whl"))
+        if _norm(whl.name.split("-")[0]) == _norm(name) and whl.name.split("-")[1] == version
+    ]
+
+
+def wheel_fits(whl: Path, platforms: list) -> bool:
+    """True if the wheel's tags are py3-none-any or cp311-(cp311|abi3|none)-<one of platforms>."""
+    cp = "cp" + "".join(map(str, TARGET_PYTHON))
+    py_tags, abi_tags, plat_tags = whl.name[:-len(".whl")].split("-")[-3:]
+    for py in py_tags.split("."):
+        for abi in abi_tags.split("."):
+            for plat in plat_tags.split("."):
+                if plat == "any" and abi == "none" and py in ("py3", cp):
+                    return True
+                if plat not in platforms:
+                    continue
+                if py == cp and abi in (cp, "none"):
+                    return True
+                # Stable-ABI wheels built for an older CPython 3 also load on the target
+                if abi == "abi3" and py.startswith("cp3") and int(py[3:]) <= TARGET_PYTHON[1]:
+                    return True
+    return False
+
+
+def find_wheel(name: str, version: str, platforms: list = PLATFORMS) -> Path | None:
+    for whl in wheels_for(name, version):
+        if wheel_fits(whl, platforms):
+            return whl
+    return None
+
+
+def cmd_vendor(args) -> None:
+    WHEELS_DIR.mkdir(parents=True, exist_ok=True)
+    cmd = [
+        sys.executable, "-m", "pip", "download",
+        "--dest", str(WHEELS_DIR),
+        "--no-deps",
+        "--only-binary=:all:",
+        "--implementation", "cp",
+        "--python-version", "".join(map(str, TARGET_PYTHON)),
+        "--extra-index-url", PIWHEELS,
+    ]
+    for plat in args.platform or PLATFORMS:
+        cmd += ["--platform", plat]
+    failed = []
+    for name, version in read_lock():
+        # One requirement at a time so a missing wheel names the culprit
+        if subprocess.run(cmd + [f"{name}=={version}"]).returncode != 0:
+            failed.append(f"{name}=={version}")
+    if failed:
+        sys.exit("No wheel for: " + ", ".join(failed))
+    print(f"Wheels in {WHEELS_DIR}")
+
+
+def unpack_wheel(whl: Path, dest: Path) -> None:
+    """Install a wheel by unpacking it (purelib/platlib only; scripts and headers are not needed)."""
+    with zipfile.ZipFile(whl) as z:
+        for info in z.infolist():
+            parts = info.filename.split("/")
+            if parts[0].endswith(".data"):
+                if len(parts) < 3 or parts[1] not in ("purelib", "platlib"):
+                    continue
+                rel = "/".join(parts[2:])
+            else:
+                rel = info.filename
+            if not rel or rel.endswith("/"):
+                continue
+            target = dest / rel
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with z.open(info) as src, open(target, "wb") as out:
+                shutil.copyfileobj(src, out)
+
+
+def copy_app(dest: Path) -> None:
+    dest.mkdir(parents=True, exist_ok=True)
+    for p in sorted(PI_DIR.iterdir()):
+        if p.is_file() and p.name not in APP_EXCLUDE and not p.name.endswith((".pyc", ".pyo")):
+            shutil.copy2(p, dest / p.name)
+
+
+def precompile(root: Path, ddir: str, sourceless: bool, checked: bool = False) -> None:
+    """Compile every .py with hash-based pycs (no mtime checks, byte-identical across builds).
+
+    checked=True: the source hash is verified at import, so an edited .py is recompiled in
+    memory instead of being shadowed by the stale pyc. Unchecked pycs skip even that read.
+    """
+    mode = py_compile.PycInvalidationMode.CHECKED_HASH if checked else py_compile.PycInvalidationMode.UNCHECKED_HASH
+    ok = compileall.compile_dir(
+        str(root), quiet=1, ddir=ddir, legacy=sourceless, invalidation_mode=mode, workers=0,
+    )
+    if not ok:
+        sys.exit(f"Byte-compilation failed under {root}")
+    if sourceless:
+        for py in root.rglob("*.py"):
+            if py.with_suffix(".pyc").exists():
+                py.unlink()
+
+
+def zip_pure_packages(site: Path, zip_path: Path, epoch: int) -> list:
+    """Move pure-Python top-level packages (no extension modules) into one zip. Returns moved names."""
+    moved = []
+    entries = []
+    for top in sorted(site.iterdir()):
+        if top.name.endswith(".dist-info"):
+            continue
+        files = [top] if top.is_file() else sorted(p for p in top.rglob("*") if p.is_file())
+        if any(f.suffix in (".so", ".pyd") for f in files) or top.suffix == ".so":
+            continue
+        entries.extend(files)
+        moved.append(top)
+    stamp = time.gmtime(max(epoch, 315532800))[:6]  # zip dates start at 1980
+    # Directory entries let zipimport find namespace packages (e.g. flask/sansio)
+    dirs = sorted({str(p.relative_to(site)) + "/" for f in entries for p in f.parents if site in p.parents})
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as z:
+        for d in dirs:
+            info = zipfile.ZipInfo(d, stamp)
+            info.external_attr = (0o40755 << 16) | 0x10
+            z.writestr(info, b"")
+        for f in entries:
+            info = zipfile.ZipInfo(str(f.relative_to(site)), stamp)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            z.writestr(info, f.read_bytes())
+    for top in moved:
+        if top.is_dir():
+            shutil.rmtree(top)
+        else:
+            top.unlink()
+    return [t.name for t in moved]
+
+
+def write_wrapper(path: Path, zip_deps: bool) -> None:
+    pythonpath = f"{INSTALL_ROOT}/lib/site-packages"
+    if zip_deps:
+        pythonpath = f"{INSTALL_ROOT}/lib/deps.zip:{pythonpath}"
+    target = ".".join(map(str, TARGET_PYTHON))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        "#!/bin/sh\n"
+        "# DogPhone launcher (bundled dependencies, precompiled bytecode)\n"
+        # Another Python ignores every bundled .pyc and cannot load the compiled extensions
+        f"if ! /usr/bin/python3 -c 'import sys; sys.exit(sys.version_info[:2] != {TARGET_PYTHON!r})'; then\n"
+        f"    echo \"dogphone: bundle needs Python {target}, /usr/bin/python3 is $(/usr/bin/python3 -V 2>&1)\" >&2\n"
+        "    exit 1\n"
+        "fi\n"
+        f"export PYTHONPATH={pythonpath}\n"
+        "export PYTHONDONTWRITEBYTECODE=1\n"
+        f"export DATA_DIR=\"${{DATA_DIR:-{INSTALL_ROOT}/data}}\"\n"
+        f"exec /usr/bin/python3 {INSTALL_ROOT}/app/launcher.py \"$@\"\n"
+    )
+    path.chmod(0o755)
+
+
+def write_units(overlay: Path) -> None:
+    """systemd unit and desktop autostart entry, adapted from pi/ to the bundle paths."""
+    wrapper = f"{INSTALL_ROOT}/bin/dogphone"
+    service = (PI_DIR / "dogphone.service").read_text()
+    service = re.sub(r"^WorkingDirectory=.*$", f"WorkingDirectory={INSTALL_ROOT}", service, flags=re.M)
+    service = re.sub(r"^ExecStart=.*$", f"ExecStart={wrapper}", service, flags=re.M)
+    dest = overlay / "etc" / "systemd" / "system" / "dogphone.service"
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    dest.write_text(service)
+    desktop = (PI_DIR / "dogphone.desktop").read_text()
+    desktop = re.sub(r"^Exec=.*$", f"Exec={wrapper}", desktop, flags=re.M)
+    desktop = re.sub(r"^Path=.*$", f"Path={INSTALL_ROOT}", desktop, flags=re.M)
+    dest = overlay / "etc" / "xdg" / "autostart" / "dogphone.desktop"
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    dest.write_text(desktop)
+
+
+def write_tarball(overlay: Path, tar_path: Path, epoch: int, owner: int) -> None:
+    """Deterministic tar.gz: sorted entries, fixed mtimes, root-owned except writable dirs."""
+    root = INSTALL_ROOT.lstrip("/")
+    writable = (f"{root}/config", f"{root}/data")
+
+    def norm(info: tarfile.TarInfo) -> tarfile.TarInfo:
+        info.mtime = epoch
+        info.mode = 0o755 if info.isdir() or info.mode & 0o111 else 0o644
+        info.uid = info.gid = 0
+        info.uname = info.gname = "root"
+        if info.name.startswith(writable):
+            info.uid = info.gid = owner
+            info.uname = info.gname = ""
+        return info
+
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w", format=tarfile.PAX_FORMAT) as tar:
+        for p in sorted(overlay.rglob("*")):
+            tar.add(p, arcname=str(p.relative_to(overlay)), recursive=False, filter=norm)
+    with open(tar_path, "wb") as f:
+        with gzip.GzipFile(filename="", mode="wb", fileobj=f, mtime=0) as gz:
+            gz.write(buf.getvalue())
+
+
+def tree_size(root: Path) -> tuple[int, int]:
+    files = [p for p in root.rglob("*") if p.is_file()]
+    return len(files), sum(p.stat().st_size for p in files)
+
+
+def measure_boot(app: Path, pythonpath: str, runs: int = 3) -> float | None:
+    """Best-of-N wall time (ms) to import the boot modules in a fresh interpreter."""
+    env = {**os.environ, "PYTHONPATH": f"{app}{os.pathsep}{pythonpath}", "PYTHONDONTWRITEBYTECODE": "1"}
+    env.pop("PYTHONSTARTUP", None)
+    best = None
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        r = subprocess.run(
+            [sys.executable, "-s", "-c", BOOT_IMPORTS],
+            cwd=app, env=env, capture_output=True, timeout=120,
+        )
+        elapsed = (time.perf_counter() - t0) * 1000
+        if r.returncode != 0:
+            print("Boot import check failed:", r.stderr.decode(errors="replace")[-500:], file=sys.stderr)
+            return None
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def measure_first_boot(app: Path, lib: Path, zip_deps: bool, sourceless: bool) -> dict:
+    """Boot time (entry-script compiles + imports) with the bundled bytecode vs. with every .pyc removed."""
+    pythonpath = str(lib / "site-packages")
+    if zip_deps:
+        pythonpath = f"{lib / 'deps.zip'}{os.pathsep}{pythonpath}"
+    with_pyc = measure_boot(app, pythonpath)
+    without_pyc = None
+    if not sourceless:
+        with tempfile.TemporaryDirectory(prefix="dogphone-nopyc-") as tmp:
+            tmp_app, tmp_lib = Path(tmp) / "app", Path(tmp) / "site-packages"
+            ignore = shutil.ignore_patterns("__pycache__", "*.pyc")
+            shutil.copytree(app, tmp_app, ignore=ignore)
+            shutil.copytree(lib / "site-packages", tmp_lib, ignore=ignore)
+            without_pyc = measure_boot(tmp_app, str(tmp_lib), runs=1)
+    return {"boot_import_ms": with_pyc, "boot_import_ms_without_pyc": without_pyc}
+
+
+def cmd_build(args) -> None:
+    if sys.version_info[:2] != TARGET_PYTHON and not args.any_python:
+        sys.exit(
+            f"Bytecode must be built with Python {'.'.join(map(str, TARGET_PYTHON))} "
+            f"(this is {sys.version.split()[0]}); use build/Dockerfile or pass --any-python"
+        )
+    pins = read_lock()
+    platforms = args.platform or PLATFORMS
+    missing = []
+    for name, version in pins:
+        if find_wheel(name, version, platforms) is None:
+            wrong = [w.name for w in wheels_for(name, version)]
+            missing.append(f"{name}=={version}" + (f" (wrong Python/platform: {', '.join(wrong)})" if wrong else ""))
+    if missing:
+        sys.exit(
+            f"No wheel for CPython {'.'.join(map(str, TARGET_PYTHON))} on {', '.join(platforms)} "
+            "(run: build_image.py vendor):\n  " + "\n  ".join(missing)
+        )
+
+    epoch = source_date_epoch()
+    started = time.perf_counter()
+    out = Path(args.out)
+    overlay = out / "overlay"
+    if overlay.exists():
+        shutil.rmtree(overlay)
+    root = overlay / INSTALL_ROOT.lstrip("/")
+    app, lib = root / "app", root / "lib"
+    site = lib / "site-packages"
+
+    copy_app(app)
+    (root / "config").mkdir(parents=True)
+    shutil.copy2(REPO_ROOT / "config" / "config.example.env", root / "config" / "config.example.env")
+    (root / "data").mkdir()
+    site.mkdir(parents=True)
+    for name, version in pins:
+        unpack_wheel(find_wheel(name, version, platforms), site)
+
+    # App sources may get hotfixed on the device; frozen dependencies never are
+    precompile(app, f"{INSTALL_ROOT}/app", sourceless=False, checked=True)
+    for script in ENTRY_SCRIPTS:
+        for pyc in (app / "__pycache__").glob(Path(script).stem + ".*.pyc"):
+            pyc.unlink()
+    sourceless = args.sourceless or args.zip_deps
+    precompile(site, f"{INSTALL_ROOT}/lib/site-packages", sourceless=sourceless)
+    zipped = zip_pure_packages(site, lib / "deps.zip", epoch) if args.zip_deps else []
+    write_wrapper(root / "bin" / "dogphone", args.zip_deps)
+    write_units(overlay)
+
+    for p in overlay.rglob("*"):
+        os.utime(p, (epoch, epoch), follow_symlinks=False)
+    from config import VERSION
+    tar_path = out / f"dogphone-overlay-{VERSION}.tar.gz"
+    write_tarball(overlay, tar_path, epoch, args.owner_uid)
+
+    n_app, app_bytes = tree_size(app)
+    n_lib, lib_bytes = tree_size(lib)
+    report = {
+        "version": VERSION,
+        "built": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "source_date_epoch": epoch,
+        "python": sys.version.split()[0],
+        "sourceless": sourceless,
+        "zip_deps": zipped,
+        "files": n_app + n_lib,
+        "app_bytes": app_bytes,
+        "deps_bytes": lib_bytes,
+        "tarball": tar_path.name,
+        "tarball_bytes": tar_path.stat().st_size,
+        "tarball_sha256": hashlib.sha256(tar_path.read_bytes()).hexdigest(),
+        "build_secs": round(time.perf_counter() - started, 1),
+    }
+    if not args.no_measure:
+        report.update(measure_first_boot(app, lib, args.zip_deps, sourceless))
+    (out / "build-report.json").write_text(json.dumps(report, indent=2) + "\n")
+    with open(args.history, "a") as f:
+        f.write(json.dumps(report, separators=(",", ":")) + "\n")
+
+    mib = 1024 * 1024
+    print(f"Overlay:   {overlay}")
+    print(f"Tarball:   {tar_path} ({report['tarball_bytes'] / mib:.1f} MiB, sha256 {report['tarball_sha256'][:16]}…)")
+    print(f"Bundle:    {report['files']} files, app {app_bytes / 1024:.0f} KiB, deps {lib_bytes / mib:.1f} MiB")
+    if report.get("boot_import_ms") is not None:
+        line = f"Boot (entry scripts + imports): {report['boot_import_ms']:.0f} ms with bundled bytecode"
+        if report.get("boot_import_ms_without_pyc") is not None:
+            line += f", {report['boot_import_ms_without_pyc']:.0f} ms compiling on first boot"
+        print(line + " (this machine)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the DogPhone app bundle and rootfs overlay.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("vendor", help="Download pinned wheels into build/wheels (needs network)")
+    p.add_argument("--platform", action="append", help="Wheel platform tag (repeatable; default: aarch64)")
+    p = sub.add_parser("build", help="Build the bundle and overlay from build/wheels (offline)")
+    p.add_argument("--platform", action="append", help="Accepted wheel platform tag (repeatable; default: aarch64)")
+    p.add_argument("--out", default=str(OUT_DIR))
+    p.add_argument("--sourceless", action="store_true", help="Ship dependency .pyc only (drop their .py)")
+    p.add_argument("--zip-deps", action="store_true", help="Pack pure-Python dependencies into lib/deps.zip")
+    p.add_argument("--owner-uid", type=int, default=1000, help="uid/gid owning config/ and data/ (pi user)")
+    p.add_argument("--history", default=str(HISTORY_FILE), help="Append the build report here (JSON lines, local)")
+    p.add_argument("--no-measure", action="store_true", help="Skip the first-boot import timing")
+    p.add_argument("--any-python", action="store_true", help="Allow a Python other than the target (testing only)")
+    args = parser.parse_args()
+    sys.path.insert(0, str(PI_DIR))
+    if args.command == "vendor":
+        cmd_vendor(args)
+    else:
+        cmd_build(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+DogPhone fleet collector – runs on any Linux box on the same network as the units.
+
+- Registry: JSON file listing devices (name, status server URL, FLEET_TOKEN).
+- Polls each device's /api/device, /api/metrics (and /api/version when unknown)
+  concurrently with asyncio over one pooled aiohttp session.
+- Failing devices back off exponentially (with jitter) instead of being hammered.
+- Numeric results go into a compact time-series store (store.py).
+- Serves a fleet dashboard (/) and JSON API (/api/devices, /api/devices/<name>/series)
+  and batch-triggers updates (POST /api/actions/update) with a concurrency limit.
+
+On each DogPhone set STATUS_HOST=0.0.0.0 and FLEET_TOKEN in config.env.
+
+The collector holds every device's token, so its own API is guarded too: actions need
+a JSON body (Content-Type: application/json) from a same-origin page, and with
+--token (COLLECTOR_TOKEN) every /api/ request needs X-Collector-Token; open the
+dashboard as /?token=... to pass it. --host other than localhost requires --token.
+
+Run:  python fleet/collector.py --registry fleet/devices.json
+Try:  python fleet/standin.py --count 20 --registry /tmp/fleet.json   (stand-in devices)
+"""
+import argparse
+import asyncio
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import random
+import signal
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from store import TimeSeriesStore
+
+try:
+    import aiohttp
+    from aiohttp import web
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+    aiohttp = web = None
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+log = logging.getLogger("fleet")
+logging.getLogger("aiohttp.access").setLevel(logging.WARNING)
+
+ACTIONS = {"update": "/api/update"}
+METRIC_KEYS = ("rss_kb", "fds", "threads", "children", "chromium_processes", "load_1m")
+
+
+class Device:
+    def __init__(self, name: str, url: str, token: str = ""):
+        self.name = name
+        self.url = url.rstrip("/")
+        self.token = token
+        self.status = {}
+        self.metrics = {}
+        self.version = None
+        self.up = None
+        self.failures = 0
+        self.next_poll = 0.0
+        self.last_ok = None
+        self.last_error = None
+        self.polling = False
+
+    @property
+    def headers(self) -> dict:
+        return {"X-Fleet-Token": self.token} if self.token else {}
+
+    def to_dict(self, now: float) -> dict:
+        return {
+            "name": self.name,
+            "url": self.url,
+            "up": self.up,
+            "version": self.version,
+            "status": self.status,
+            "metrics": self.metrics,
+            "failures": self.failures,
+            "next_poll_in": max(0, round(self.next_poll - now, 1)),
+            "last_ok": self.last_ok,
+            "last_error": self.last_error,
+        }
+
+
+def load_registry(path: Path) -> list:
+    """Registry: {"devices": [{"name": ..., "url": "http://10.0.0.5:8767", "token": ...}, ...]} or a bare list."""
+    data = json.loads(Path(path).read_text())
+    entries = data.get("devices", []) if isinstance(data, dict) else data
+    return [Device(e["name"], e["url"], e.get("token", "")) for e in entries]
+
+
+class Collector:
+    def __init__(
+        self,
+        devices: list,
+        store: TimeSeriesStore,
+        interval: float = 30.0,
+        max_backoff: float = 600.0,
+        concurrency: int = 32,
+        timeout: float = 5.0,
+    ):
+        self.devices = {d.name: d for d in devices}
+        self.store = store
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.session = None
+        self._sem = asyncio.Semaphore(concurrency)
+        self._tasks = set()
+
+    async def start(self) -> None:
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=2, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+
+    async def close(self) -> None:
+        if self.session:
+            await self.session.close()
+
+    async def _get_json(self, dev: Device, path: str) -> dict:
+        async with self.session.get(dev.url + path, headers=dev.headers) as r:
+            r.raise_for_status()
+            return await r.json(content_type=None)
+
+    async def poll_device(self, dev: Device) -> None:
+        async with self._sem:
+            t0 = time.monotonic()
+            now = time.time()
+            try:
+                status, metrics = await asyncio.gather(
+                    self._get_json(dev, "/api/device"),
+                    self._get_json(dev, "/api/metrics"),
+                )
+                if dev.version is None:
+                    dev.version = (await self._get_json(dev, "/api/version")).get("version")
+            except Exception as e:
+                dev.up = False
+                dev.failures += 1
+                dev.last_error = f"{type(e).__name__}: {e}"[:200]
+                delay = min(self.interval * 2 ** dev.failures, self.max_backoff)
+                dev.next_poll = time.monotonic() + delay * random.uniform(0.8, 1.2)
+                self.store.add(now, dev.name, "up", 0)
+                if dev.failures == 1:
+                    log.warning("%s unreachable: %s", dev.name, dev.last_error)
+                return
+            finally:
+                dev.polling = False
+            if dev.failures:
+                log.info("%s back up after %d failures", dev.name, dev.failures)
+            dev.up = True
+            dev.failures = 0
+            dev.last_error = None
+            dev.last_ok = now
+            dev.status = status
+            dev.metrics = {k: metrics.get(k) for k in METRIC_KEYS}
+            if status.get("version"):
+                dev.version = status["version"]
+            dev.next_poll = time.monotonic() + self.interval * random.uniform(0.9, 1.1)
+            self.store.add_many(now, dev.name, {
+                "up": 1,
+                "latency_ms": (time.monotonic() - t0) * 1000,
+                "main_up": bool(status.get("main_up")),
+                "internet": bool(status.get("internet")),
+                **dev.metrics,
+            })
+
+    async def poll_loop(self, tick: float = 1.0, flush_every: float = 30.0) -> None:
+        """Start polls for due devices every tick; flush the store to disk every flush_every."""
+        loop = asyncio.get_running_loop()
+        last_flush = time.monotonic()
+        while True:
+            now = time.monotonic()
+            for dev in self.devices.values():
+                if not dev.polling and dev.next_poll <= now:
+                    dev.polling = True
+                    task = asyncio.create_task(self.poll_device(dev))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+            if now - last_flush >= flush_every:
+                last_flush = now
+                await loop.run_in_executor(None, self.store.flush)
+            await asyncio.sleep(tick)
+
+    async def run_action(self, action: str, names: list | None = None, concurrency: int = 4) -> list:
+        """POST the action to each device (all if names is None), at most `concurrency` at a time."""
+        path = ACTIONS[action]
+        targets = [d for d in self.devices.values() if names is None or d.name in names]
+        sem = asyncio.Semaphore(max(1, concurrency))
+
+        async def one(dev: Device) -> dict:
+            async with sem:
+                try:
+                    async with self.session.post(
+                        dev.url + path,
+                        headers=dev.headers,
+                        timeout=aiohttp.ClientTimeout(total=180),
+                    ) as r:
+                        data = await r.json(content_type=None)
+                        ok = r.status == 200 and bool(data.get("ok"))
+                        result = {"name": dev.name, "ok": ok, "message": data.get("message", "")}
+                except Exception as e:
+                    result = {"name": dev.name, "ok": False, "message": f"{type(e).__name__}: {e}"[:200]}
+                # Re-read version and state soon after an update
+                dev.version = None
+                dev.next_poll = 0.0
+                return result
+
+        results = await asyncio.gather(*(one(d) for d in targets))
+        log.info("%s: %d/%d ok", action, sum(r["ok"] for r in results), len(results))
+        return results
+
+
+DASHBOARD_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>DogPhone fleet</title>
+<style>
+body { font-family: sans-serif; margin: 2rem; }
+table { border-collapse: collapse; width: 100%; }
+th, td { text-align: left; padding: 0.3rem 0.6rem; border-bottom: 1px solid #ddd; }
+.ok { color: #080; } .warn { color: #b60; } .bad { color: #b00; }
+</style></head>
+<body>
+<h1>DogPhone fleet</h1>
+<p><span id="summary"></span> <button onclick="updateAll()">Update all</button></p>
+<table><thead><tr>
+<th>Device</th><th>Up</th><th>Version</th><th>Main app</th><th>Internet</th>
+<th>RSS MiB</th><th>Chromium</th><th>Failures</th><th>Last error</th>
+</tr></thead><tbody id="rows"></tbody></table>
+<script>
+function cls(v) { return v ? 'ok' : (v === false ? 'bad' : 'warn'); }
+function yn(v) { return v ? 'yes' : (v === false ? 'no' : '?'); }
+function esc(s) { return String(s == null ? '' : s).replace(/[&<>"]/g, c => ({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;'}[c])); }
+const TOKEN = new URLSearchParams(location.search).get('token') || '';
+function authHeaders(extra) { return Object.assign(TOKEN ? {'X-Collector-Token': TOKEN} : {}, extra || {}); }
+async function refresh() {
+  const devs = await (await fetch('api/devices', {headers: authHeaders()})).json();
+  const up = devs.filter(d => d.up).length;
+  document.getElementById('summary').textContent = up + ' / ' + devs.length + ' up';
+  document.getElementById('rows').innerHTML = devs.map(d => '<tr>' +
+    '<td>' + esc(d.name) + '</td>' +
+    '<td class="' + cls(d.up) + '">' + yn(d.up) + '</td>' +
+    '<td>' + esc(d.version || '?') + '</td>' +
+    '<td class="' + cls(d.status.main_up) + '">' + yn(d.status.main_up) + '</td>' +
+    '<td class="' + cls(d.status.internet) + '">' + yn(d.status.internet) + '</td>' +
+    '<td>' + (d.metrics.rss_kb ? (d.metrics.rss_kb / 1024).toFixed(1) : '') + '</td>' +
+    '<td>' + esc(d.metrics.chromium_processes) + '</td>' +
+    '<td>' + d.failures + '</td>' +
+    '<td>' + esc(d.last_error) + '</td></tr>').join('');
+}
+async function updateAll() {
+  if (!confirm('Run update on all devices?')) return;
+  const r = await (await fetch('api/actions/update', {method: 'POST', headers: authHeaders({'Content-Type': 'application/json'}), body: '{}'})).json();
+  alert(r.results.filter(x => x.ok).length + ' / ' + r.results.length + ' updated');
+  refresh();
+}
+refresh();
+setInterval(refresh, 5000);
+</script>
+</body></html>
+"""
+
+
+MAX_ACTION_CONCURRENCY = 64
+
+
+def _bad_request(message: str):
+    return web.json_response({"ok": False, "error": message}, status=400)
+
+
+def create_app(collector: Collector, token: str = ""):
+    @web.middleware
+    async def check_token(request, handler):
+        if token and request.path.startswith("/api/"):
+            given = request.headers.get("X-Collector-Token", "")
+            if not hmac.compare_digest(given.encode(), token.encode()):
+                return web.json_response({"error": "forbidden"}, status=403)
+        return await handler(request)
+
+    app = web.Application(middlewares=[check_token])
+
+    async def index(request):
+        return web.Response(text=DASHBOARD_HTML, content_type="text/html")
+
+    async def api_devices(request):
+        now = time.monotonic()
+        return web.json_response([d.to_dict(now) for d in collector.devices.values()])
+
+    async def api_series(request):
+        name = request.match_info["name"]
+        if name not in collector.devices:
+            return web.json_response({"error": "unknown device"}, status=404)
+        metric = request.query.get("metric", "up")
+        try:
+            since = float(request.query.get("since", time.time() - 3600))
+        except ValueError:
+            return _bad_request("since must be a Unix timestamp")
+        points = collector.store.query(name, metric, since)
+        return web.json_response({"device": name, "metric": metric, "points": points})
+
+    async def api_action(request):
+        action = request.match_info["action"]
+        if action not in ACTIONS:
+            return web.json_response({"ok": False, "error": "unknown action"}, status=404)
+        # A JSON content type cannot be sent cross-site without a CORS preflight (which
+        # is never answered), so other web pages cannot trigger fleet-wide actions
+        if request.content_type != "application/json":
+            return web.json_response({"ok": False, "error": "Content-Type must be application/json"}, status=415)
+        origin = request.headers.get("Origin")
+        if origin and origin != f"{request.scheme}://{request.host}":
+            return web.json_response({"ok": False, "error": "cross-origin request"}, status=403)
+        try:
+            data = await request.json() if request.can_read_body else {}
+        except ValueError:
+            return _bad_request("body must be JSON")
+        if not isinstance(data, dict):
+            return _bad_request("body must be a JSON object")
+        names = data.get("devices")
+        if names is not None and (not isinstance(names, list) or not all(isinstance(n, str) for n in names)):
+            return _bad_request("devices must be a list of device names")
+        concurrency = data.get("concurrency", 4)
+        if isinstance(concurrency, bool) or not isinstance(concurrency, int):
+            return _bad_request("concurrency must be an integer")
+        concurrency = min(max(concurrency, 1), MAX_ACTION_CONCURRENCY)
+        results = await collector.run_action(action, names, concurrency)
+        return web.json_response({"ok": all(r["ok"] for r in results), "results": results})
+
+    app.router.add_get("/", index)
+    app.router.add_get("/api/devices", api_devices)
+    app.router.add_get("/api/devices/{name}/series", api_series)
+    app.router.add_post("/api/actions/{action}", api_action)
+    return app
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+async def serve(args) -> None:
+    devices = load_registry(args.registry)
+    store = TimeSeriesStore(args.data)
+    collector = Collector(
+        devices,
+        store,
+        interval=args.interval,
+        max_backoff=args.max_backoff,
+        concurrency=args.concurrency,
+        timeout=args.timeout,
+    )
+    await collector.start()
+    runner = web.AppRunner(create_app(collector, args.token))
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    log.info(
+        "Fleet collector: %d devices, dashboard at http://%s:%s/%s",
+        len(devices), args.host, args.port, "?token=..." if args.token else "",
+    )
+    poller = asyncio.create_task(collector.poll_loop())
+    # Stop cleanly on SIGTERM (systemd) so pending samples are flushed
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, poller.cancel)
+    try:
+        await poller
+    except asyncio.CancelledError:
+        pass
+    finally:
+        store.flush()
+        await runner.cleanup()
+        await collector.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Poll many DogPhones and serve a fleet dashboard.")
+    parser.add_argument("--registry", type=Path, default=Path(__file__).resolve().parent / "devices.json")
+    parser.add_argument("--data", type=Path, default=Path("fleet-data") / "fleet.ts", help="Time-series file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8780)
+    parser.add_argument("--interval", type=float, default=30.0, help="Seconds between polls per device")
+    parser.add_argument("--max-backoff", type=float, default=600.0, help="Max seconds between polls of a failing device")
+    parser.add_argument("--concurrency", type=int, default=32, help="Max devices polled at once")
+    parser.add_argument("--timeout", type=float, default=5.0, help="Per-request timeout in seconds")
+    parser.add_argument("--token", default=os.environ.get("COLLECTOR_TOKEN", ""),
+                        help="Require X-Collector-Token on /api/ (default: $COLLECTOR_TOKEN)")
+    args = parser.parse_args()
+    if not _is_loopback(args.host) and not args.token:
+        parser.error("--host other than localhost needs --token (or COLLECTOR_TOKEN): the API can update every device")
+    if not HAS_AIOHTTP:
+        log.error("Install aiohttp: pip install -r fleet/requirements.txt")
+        sys.exit(1)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
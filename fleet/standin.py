@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Stand-in DogPhone devices for trying / testing the fleet collector locally.
+
+Starts --count fake status servers (one port each) that answer /api/device,
+/api/metrics, /api/version and POST /api/update like a real unit, with some
+latency, a few permanently offline devices and occasional errors. Writes a
+registry file the collector can use:
+
+  python fleet/standin.py --count 20 --registry /tmp/fleet.json
+  python fleet/collector.py --registry /tmp/fleet.json --interval 5
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+from pathlib import Path
+
+try:
+    from aiohttp import web
+except ImportError:
+    print("Install aiohttp: pip install -r fleet/requirements.txt", file=sys.stderr)
+    sys.exit(1)
+
+
+def create_device_app(name: str, token: str, latency: float, error_rate: float):
+    state = {"version": "1.0.0", "rss_kb": random.randint(30000, 60000)}
+
+    def authorized(request) -> bool:
+        return not token or request.headers.get("X-Fleet-Token") == token
+
+    async def respond(request, payload: dict):
+        if not authorized(request):
+            return web.json_response({"error": "forbidden"}, status=403)
+        await asyncio.sleep(random.uniform(0, latency))
+        if random.random() < error_rate:
+            return web.json_response({"error": "stand-in failure"}, status=500)
+        return web.json_response(payload)
+
+    async def device(request):
+        return await respond(request, {
+            "version": state["version"],
+            "configured": True,
+            "main_up": random.random() > 0.05,
+            "internet": random.random() > 0.05,
+            "ips": "127.0.0.1",
+        })
+
+    async def metrics(request):
+        state["rss_kb"] += random.randint(-500, 800)
+        return await respond(request, {
+            "rss_kb": state["rss_kb"],
+            "fds": random.randint(10, 40),
+            "threads": random.randint(3, 8),
+            "children": random.randint(0, 3),
+            "chromium_processes": random.randint(0, 12),
+            "load_1m": round(random.uniform(0.1, 2.0), 2),
+        })
+
+    async def version(request):
+        return await respond(request, {"version": state["version"]})
+
+    async def update(request):
+        await asyncio.sleep(random.uniform(0.1, 1.0))
+        state["version"] = "1.0.1"
+        return await respond(request, {"ok": True, "message": "Updated."})
+
+    app = web.Application()
+    app.router.add_get("/api/device", device)
+    app.router.add_get("/api/metrics", metrics)
+    app.router.add_get("/api/version", version)
+    app.router.add_post("/api/update", update)
+    return app
+
+
+async def run(args) -> None:
+    entries = []
+    runners = []
+    for i in range(args.count):
+        name = f"dogphone-{i:03d}"
+        port = args.base_port + i
+        entries.append({"name": name, "url": f"http://127.0.0.1:{port}", "token": args.token})
+        if i < args.offline:
+            continue  # in the registry but nothing listening
+        runner = web.AppRunner(create_device_app(name, args.token, args.latency, args.error_rate))
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        runners.append(runner)
+    Path(args.registry).write_text(json.dumps({"devices": entries}, indent=2) + "\n")
+    print(f"{len(runners)} stand-in devices up ({args.offline} offline); registry: {args.registry}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for r in runners:
+            await r.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run stand-in DogPhone status servers.")
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--base-port", type=int, default=9100)
+    parser.add_argument("--offline", type=int, default=1, help="How many registry entries have no server")
+    parser.add_argument("--latency", type=float, default=0.2, help="Max random response delay (s)")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Fraction of requests answered with 500")
+    parser.add_argument("--token", default="standin-token")
+    parser.add_argument("--registry", type=Path, default=Path("/tmp/dogphone-fleet.json"))
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
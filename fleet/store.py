@@ -0,0 +1,167 @@
+"""
+Compact time-series store for the fleet collector.
+
+Samples are (timestamp, device, metric, value). In memory each (device, metric)
+series is a pair of fixed-size ring buffers (array 'I' seconds + array 'f' values,
+8 bytes per sample). On disk they are appended as 12-byte records
+(uint32 time, uint16 device id, uint16 metric id, float32 value) to one file, with
+device/metric names in a small JSON index next to it. The file is rewritten
+(compacted) from memory once it grows past max_file_records.
+"""
+import json
+import os
+import struct
+import threading
+from array import array
+from pathlib import Path
+
+RECORD = struct.Struct("<IHHf")
+
+
+class Series:
+    """Fixed-capacity ring buffer of (time, value)."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.times = array("I", bytes(4 * capacity))
+        self.values = array("f", bytes(4 * capacity))
+        self.start = 0
+        self.size = 0
+
+    def append(self, t: int, v: float) -> None:
+        i = (self.start + self.size) % self.capacity
+        self.times[i] = t
+        self.values[i] = v
+        if self.size < self.capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def items(self, since: int = 0) -> list:
+        out = []
+        for k in range(self.size):
+            i = (self.start + k) % self.capacity
+            if self.times[i] >= since:
+                out.append((self.times[i], self.values[i]))
+        return out
+
+    def last(self):
+        if not self.size:
+            return None
+        i = (self.start + self.size - 1) % self.capacity
+        return self.times[i], self.values[i]
+
+
+class TimeSeriesStore:
+    def __init__(self, path: Path | None = None, capacity: int = 2880, max_file_records: int = 500_000):
+        """capacity: samples kept per series (2880 = 24 h at one sample per 30 s)."""
+        self.path = Path(path) if path else None
+        self.capacity = capacity
+        self.max_file_records = max_file_records
+        self.series = {}
+        self.devices = {}
+        self.metrics = {}
+        self._pending = bytearray()
+        self._file_records = 0
+        self._lock = threading.Lock()
+        if self.path:
+            self._load()
+
+    @property
+    def _index_path(self) -> Path:
+        return self.path.with_suffix(".json")
+
+    def _id(self, table: dict, name: str) -> int:
+        if name not in table:
+            table[name] = len(table)
+        return table[name]
+
+    def add(self, t: float, device: str, metric: str, value: float) -> None:
+        t = int(t)
+        with self._lock:
+            d = self._id(self.devices, device)
+            m = self._id(self.metrics, metric)
+            key = (device, metric)
+            if key not in self.series:
+                self.series[key] = Series(self.capacity)
+            self.series[key].append(t, float(value))
+            if self.path:
+                self._pending += RECORD.pack(t, d, m, float(value))
+
+    def add_many(self, t: float, device: str, values: dict) -> None:
+        """Store every numeric (or bool) value in values."""
+        for metric, v in values.items():
+            if isinstance(v, (int, float)):
+                self.add(t, device, metric, float(v))
+
+    def query(self, device: str, metric: str, since: float = 0) -> list:
+        with self._lock:
+            s = self.series.get((device, metric))
+            return s.items(int(since)) if s else []
+
+    def latest(self, device: str) -> dict:
+        with self._lock:
+            out = {}
+            for (dev, metric), s in self.series.items():
+                if dev == device and s.size:
+                    out[metric] = s.last()[1]
+            return out
+
+    def flush(self) -> None:
+        """Append pending samples to disk (one write + fsync); compact if the file is too big."""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._pending:
+                return
+            data, self._pending = bytes(self._pending), bytearray()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._write_index()
+            with open(self.path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self._file_records += len(data) // RECORD.size
+            if self._file_records > self.max_file_records:
+                self._compact()
+
+    def _write_index(self) -> None:
+        tmp = self._index_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps({"devices": self.devices, "metrics": self.metrics}))
+        os.replace(tmp, self._index_path)
+
+    def _compact(self) -> None:
+        """Rewrite the data file with only what is still in memory."""
+        rows = []
+        for (device, metric), s in self.series.items():
+            d, m = self.devices[device], self.metrics[metric]
+            rows.extend((t, d, m, v) for t, v in s.items())
+        rows.sort()
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(b"".join(RECORD.pack(*r) for r in rows))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._file_records = len(rows)
+
+    def _load(self) -> None:
+        if not self.path.exists() or not self._index_path.exists():
+            return
+        index = json.loads(self._index_path.read_text())
+        self.devices = index.get("devices", {})
+        self.metrics = index.get("metrics", {})
+        dev_names = {v: k for k, v in self.devices.items()}
+        met_names = {v: k for k, v in self.metrics.items()}
+        data = self.path.read_bytes()
+        usable = len(data) - len(data) % RECORD.size
+        if usable != len(data):
+            # Drop a torn last record so later appends stay aligned
+            os.truncate(self.path, usable)
+        for t, d, m, v in RECORD.iter_unpack(data[:usable]):
+            if d in dev_names and m in met_names:
+                key = (dev_names[d], met_names[m])
+                if key not in self.series:
+                    self.series[key] = Series(self.capacity)
+                self.series[key].append(t, v)
+        self._file_records = usable // RECORD.size
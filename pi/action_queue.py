@@ -0,0 +1,286 @@
+"""
+DogPhone offline action queue: durable, append-only, flushed in batches.
+
+Outbound notifications ("dog pressed the button", "treat dispensed") and deferred
+commands (e.g. an update requested while offline) are appended to a local log
+instead of being tried once and lost. A background thread delivers them when the
+internet probe succeeds again:
+
+- Coalescing: items with the same dedup key merge into one pending item (count + last
+  time), and each sender gets a whole batch at once (one Telegram message for many presses).
+- Expiry: every item has a TTL; stale items are dropped instead of delivered late.
+- Backoff: failed deliveries retry with exponential backoff; new items do not cut it
+  short, and no probes run while presence detection says nobody is there.
+- Bounded fsyncs: appends are written immediately but fsynced at most once per
+  sync_interval (group commit), plus one fsync per delivered batch.
+
+Log format (JSON lines): {"op": "add", ...}, {"op": "merge", ...}, {"op": "done", "ids": [...]}.
+The log is rewritten with only pending items once enough "done" records pile up.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from config import load_config
+
+log = logging.getLogger("dogphone.queue")
+
+
+def internet_ok(url: str | None = None) -> bool:
+    """True if url (default: INTERNET_PROBE_URL from config) answers."""
+    try:
+        import urllib.request
+        urllib.request.urlopen(url or load_config()["internet_probe_url"], timeout=3)
+        return True
+    except Exception:
+        return False
+
+
+class ActionQueue:
+    def __init__(
+        self,
+        path: Path,
+        probe=internet_ok,
+        sync_interval: float = 2.0,
+        batch_size: int = 50,
+        retry_min: float = 5.0,
+        retry_max: float = 300.0,
+        compact_after: int = 500,
+    ):
+        self.path = Path(path)
+        self.probe = probe
+        self.sync_interval = sync_interval
+        self.batch_size = batch_size
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self.compact_after = compact_after
+        self.senders = {}
+        self.items = {}
+        self._by_key = {}
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._file = None
+        self._dirty = False
+        self._last_sync = 0.0
+        self._dead_records = 0
+        self._retry_delay = retry_min
+        self._next_attempt = 0.0
+        self._load()
+
+    def register(self, kind: str, sender) -> None:
+        """sender(items: list[dict]) -> bool delivers a batch; kinds sharing a sender are batched together."""
+        self.senders[kind] = sender
+
+    def enqueue(self, kind: str, payload: dict | None = None, dedup_key: str | None = None, ttl: float = 86400) -> str:
+        """Queue an action. With dedup_key, merges into a pending item with the same key. Returns the item id."""
+        now = time.time()
+        with self._lock:
+            existing = self._by_key.get(dedup_key) if dedup_key else None
+            # Never merge into an item that is being sent right now (the merge would be lost)
+            if existing and existing in self.items and existing not in self._inflight:
+                item = self.items[existing]
+                item["count"] += 1
+                item["last"] = now
+                item["exp"] = max(item["exp"], now + ttl)
+                merge = {"op": "merge", "id": existing, "last": now, "count": item["count"], "exp": item["exp"]}
+                if payload is not None:
+                    # Latest payload wins (e.g. the call URL after a failover)
+                    item["payload"] = merge["payload"] = payload
+                self._append(merge)
+                item_id = existing
+            else:
+                item_id = uuid.uuid4().hex[:12]
+                item = {
+                    "id": item_id,
+                    "kind": kind,
+                    "payload": payload or {},
+                    "key": dedup_key,
+                    "ts": now,
+                    "last": now,
+                    "count": 1,
+                    "exp": now + ttl,
+                }
+                self.items[item_id] = item
+                if dedup_key:
+                    self._by_key[dedup_key] = item_id
+                self._append({"op": "add", **item})
+        if self._retry_delay == self.retry_min:
+            # Not backing off after a failure: deliver soon. During an outage new items
+            # wait for the scheduled retry instead of forcing a probe each.
+            self._next_attempt = 0.0
+        self._wake.set()
+        return item_id
+
+    def pending(self) -> list:
+        with self._lock:
+            return sorted(self.items.values(), key=lambda i: i["ts"])
+
+    def start(self) -> threading.Thread:
+        t = threading.Thread(target=self._run, name="action-queue", daemon=True)
+        t.start()
+        return t
+
+    def _run(self) -> None:
+        try:
+            from presence import wait_background_active
+        except ImportError:
+            wait_background_active = lambda timeout=None: True
+        while True:
+            now = time.monotonic()
+            timeout = None
+            if self._dirty:
+                timeout = max(0.0, self._last_sync + self.sync_interval - now)
+            if self.items:
+                wait = max(0.0, self._next_attempt - now)
+                timeout = wait if timeout is None else min(timeout, wait)
+            self._wake.wait(timeout)
+            self._wake.clear()
+            if self._dirty and time.monotonic() - self._last_sync >= self.sync_interval:
+                with self._lock:
+                    self._sync()
+            if self.items and time.monotonic() >= self._next_attempt:
+                # No probes while presence says nobody is there; keep group commits going meanwhile
+                while not wait_background_active(self.sync_interval):
+                    if self._dirty:
+                        with self._lock:
+                            self._sync()
+                try:
+                    self.flush_once()
+                except Exception as e:
+                    log.warning("Queue flush failed: %s", e)
+                    self._schedule_retry()
+
+    def flush_once(self) -> bool:
+        """Try to deliver everything pending. Returns True if the queue is empty afterwards."""
+        self._drop_expired()
+        if not self.items:
+            return True
+        if not self.probe():
+            self._schedule_retry()
+            return False
+        # Group pending items by sender so each sender gets whole batches
+        groups = {}
+        for item in self.pending():
+            sender = self.senders.get(item["kind"])
+            if sender is None:
+                continue
+            groups.setdefault(id(sender), (sender, []))[1].append(item)
+        done = []
+        failed = False
+        for sender, items in groups.values():
+            for i in range(0, len(items), self.batch_size):
+                batch = items[i:i + self.batch_size]
+                with self._lock:
+                    self._inflight.update(item["id"] for item in batch)
+                try:
+                    ok = sender([dict(item) for item in batch])
+                except Exception as e:
+                    log.warning("Sending %d queued actions failed: %s", len(batch), e)
+                    ok = False
+                finally:
+                    with self._lock:
+                        self._inflight.clear()
+                if not ok:
+                    failed = True
+                    break
+                done.extend(item["id"] for item in batch)
+        self._mark_done(done)
+        if failed:
+            self._schedule_retry()
+            return False
+        self._retry_delay = self.retry_min
+        if done:
+            log.info("Delivered %d queued actions", len(done))
+        return not self.items
+
+    def _schedule_retry(self) -> None:
+        self._next_attempt = time.monotonic() + self._retry_delay
+        self._retry_delay = min(self._retry_delay * 2, self.retry_max)
+
+    def _drop_expired(self) -> None:
+        now = time.time()
+        expired = [i["id"] for i in self.pending() if i["exp"] < now]
+        if expired:
+            log.info("Dropping %d expired queued actions", len(expired))
+            self._mark_done(expired)
+
+    def _mark_done(self, ids: list) -> None:
+        if not ids:
+            return
+        with self._lock:
+            for item_id in ids:
+                item = self.items.pop(item_id, None)
+                if item and item["key"] and self._by_key.get(item["key"]) == item_id:
+                    del self._by_key[item["key"]]
+            self._append({"op": "done", "ids": ids})
+            self._dead_records += len(ids)
+            if self._dead_records >= self.compact_after:
+                self._compact()
+            else:
+                self._sync()
+
+    # --- log file (callers hold self._lock) ---
+
+    def _append(self, record: dict) -> None:
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "a")
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._file.flush()
+        self._dirty = True
+
+    def _sync(self) -> None:
+        if self._file is not None and self._dirty:
+            os.fsync(self._file.fileno())
+        self._dirty = False
+        self._last_sync = time.monotonic()
+
+    def _compact(self) -> None:
+        """Rewrite the log with only pending items (one fsync), then swap it in."""
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            for item in self.items.values():
+                f.write(json.dumps({"op": "add", **item}, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        os.replace(tmp, self.path)
+        self._dead_records = 0
+        self._dirty = False
+        self._last_sync = time.monotonic()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        records = 0
+        torn = False
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    torn = True  # partial last line after a power cut
+                    continue
+                records += 1
+                op = rec.pop("op", None)
+                if op == "add":
+                    self.items[rec["id"]] = rec
+                elif op == "merge" and rec.get("id") in self.items:
+                    self.items[rec["id"]].update(rec)
+                elif op == "done":
+                    for item_id in rec.get("ids", []):
+                        self.items.pop(item_id, None)
+        self._by_key = {i["key"]: i["id"] for i in self.items.values() if i.get("key")}
+        self._dead_records = records - len(self.items)
+        if torn:
+            # Rewrite so new appends do not land on the partial line
+            self._compact()
+        if self.items:
+            log.info("Loaded %d pending queued actions", len(self.items))
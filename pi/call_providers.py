@@ -0,0 +1,283 @@
+"""
+DogPhone call providers: turn VIDEO_CALL_URL into a launch URL, and pick a reachable one.
+
+Providers (first match wins):
+- zoom:    meeting ID (digits, spaces/dashes ok) or zoom.us URL; password appended as pwd=
+- whereby: whereby.com room URL or "whereby:<room>"
+- jitsi:   meet.jit.si URL or "jitsi:<room>"; skips the pre-join page so the Pi joins directly
+- local:   self-hosted WebRTC room, "local:<room>" under LOCAL_CALL_BASE (or a URL below it)
+- generic: anything else (https:// added if missing)
+
+Resolved URLs are memoized per (input, password, LOCAL_CALL_BASE), so a press only
+does a dict lookup; a config change is a different key. A background thread checks
+each call host every PROVIDER_CHECK_SECS (paused while presence says nobody is there,
+with an immediate check when presence returns).
+If the primary is known to be down and VIDEO_CALL_FALLBACK_URL is up (or unknown),
+presses go to the fallback. Presses never wait on a check.
+
+Try failover locally with stand-in servers: bench/call_standin.py.
+"""
+import functools
+import logging
+import threading
+import urllib.error
+import urllib.request
+from urllib.parse import parse_qs, quote, quote_plus, urlparse
+
+log = logging.getLogger("dogphone.calls")
+
+
+def _with_scheme(raw: str) -> str:
+    if raw.startswith("http://") or raw.startswith("https://"):
+        return raw
+    return "https://" + raw
+
+
+def _host(url: str) -> str:
+    return (urlparse(url).hostname or "").lower()
+
+
+class CallProvider:
+    """Base / generic provider: any meeting URL."""
+    name = "generic"
+
+    def matches(self, raw: str, local_base: str) -> bool:
+        return True
+
+    def resolve(self, raw: str, password: str, local_base: str) -> str:
+        url = _with_scheme(raw)
+        if password:
+            url = self.add_password(url, password)
+        return url
+
+    def add_password(self, url: str, password: str) -> str:
+        if "pwd" in parse_qs(urlparse(url).query, keep_blank_values=True):
+            return url
+        sep = "&" if "?" in url else "?"
+        return f"{url}{sep}pwd={quote_plus(password)}"
+
+    def health_url(self, url: str) -> str:
+        """URL whose reachability stands for the provider (its host root by default)."""
+        p = urlparse(url)
+        return f"{p.scheme}://{p.netloc}/"
+
+
+class ZoomProvider(CallProvider):
+    name = "zoom"
+
+    @staticmethod
+    def _meeting_id(raw: str) -> str:
+        return raw.replace(" ", "").replace("-", "").replace("\u00a0", "")
+
+    def matches(self, raw: str, local_base: str) -> bool:
+        mid = self._meeting_id(raw)
+        return mid.isdigit() or _host(_with_scheme(raw)).endswith("zoom.us")
+
+    def resolve(self, raw: str, password: str, local_base: str) -> str:
+        mid = self._meeting_id(raw)
+        url = f"https://zoom.us/j/{mid}" if mid.isdigit() else _with_scheme(raw)
+        return self.add_password(url, password) if password else url
+
+
+class WherebyProvider(CallProvider):
+    name = "whereby"
+
+    def matches(self, raw: str, local_base: str) -> bool:
+        return raw.startswith("whereby:") or _host(_with_scheme(raw)).endswith("whereby.com")
+
+    def resolve(self, raw: str, password: str, local_base: str) -> str:
+        # Whereby rooms have no URL password (hosts let guests in / lock rooms)
+        if raw.startswith("whereby:"):
+            return "https://whereby.com/" + quote(raw.split(":", 1)[1].strip("/ "))
+        return _with_scheme(raw)
+
+
+class JitsiProvider(CallProvider):
+    name = "jitsi"
+    SKIP_PREJOIN = "#config.prejoinPageEnabled=false&config.prejoinConfig.enabled=false"
+
+    def matches(self, raw: str, local_base: str) -> bool:
+        return raw.startswith("jitsi:") or _host(_with_scheme(raw)) == "meet.jit.si"
+
+    def resolve(self, raw: str, password: str, local_base: str) -> str:
+        if raw.startswith("jitsi:"):
+            url = "https://meet.jit.si/" + quote(raw.split(":", 1)[1].strip("/ "))
+        else:
+            url = _with_scheme(raw)
+        return url if "#" in url else url + self.SKIP_PREJOIN
+
+
+class LocalRoomProvider(CallProvider):
+    """Self-hosted WebRTC room on the LAN (LOCAL_CALL_BASE, e.g. http://192.168.1.10:8443/room)."""
+    name = "local"
+
+    def matches(self, raw: str, local_base: str) -> bool:
+        if raw.startswith("local:"):
+            return bool(local_base)
+        return bool(local_base) and _with_scheme(raw).startswith(local_base.rstrip("/"))
+
+    def resolve(self, raw: str, password: str, local_base: str) -> str:
+        if raw.startswith("local:"):
+            url = local_base.rstrip("/") + "/" + quote(raw.split(":", 1)[1].strip("/ "))
+        else:
+            url = _with_scheme(raw)
+        return self.add_password(url, password) if password else url
+
+
+PROVIDERS = [ZoomProvider(), WherebyProvider(), JitsiProvider(), LocalRoomProvider(), CallProvider()]
+
+
+@functools.lru_cache(maxsize=32)
+def resolve_call(raw: str, password: str = "", local_base: str = "") -> tuple[str, str]:
+    """(provider name, launch URL) for a configured call; ("", "") if raw is empty or unusable."""
+    raw = (raw or "").strip()
+    if not raw:
+        return "", ""
+    password = (password or "").strip()
+    if raw.startswith("local:") and not local_base:
+        log.error("Call %r needs LOCAL_CALL_BASE (e.g. http://192.168.1.10:8443/room); not calling", raw)
+        return "", ""
+    try:
+        for provider in PROVIDERS:
+            if provider.matches(raw, local_base):
+                return provider.name, provider.resolve(raw, password, local_base)
+    except ValueError as e:
+        # Malformed URL (e.g. an unclosed "[" host): open it as given, like before providers existed
+        log.warning("Could not parse call URL %r (%s); using it as is", raw, e)
+        url = _with_scheme(raw)
+        if password:
+            url = f"{url}{'&' if '?' in url else '?'}pwd={quote_plus(password)}"
+        return CallProvider.name, url
+    return "", ""
+
+
+def provider_by_name(name: str) -> CallProvider:
+    for provider in PROVIDERS:
+        if provider.name == name:
+            return provider
+    return PROVIDERS[-1]
+
+
+class HealthMonitor:
+    """Background reachability checks. is_up() is a dict read: True, False, or None (not checked yet)."""
+
+    def __init__(self, interval: float = 60.0, timeout: float = 3.0):
+        self.interval = interval
+        self.timeout = timeout
+        self.state = {}
+        self._urls = []
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def watch(self, url: str) -> None:
+        with self._lock:
+            if url and url not in self._urls:
+                self._urls.append(url)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="call-health", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def is_up(self, url: str) -> bool | None:
+        return self.state.get(url)
+
+    def check(self, url: str) -> bool:
+        """Any HTTP answer (even 4xx/5xx) means the host is reachable; no answer means down."""
+        try:
+            req = urllib.request.Request(url, method="HEAD")
+            urllib.request.urlopen(req, timeout=self.timeout).close()
+            return True
+        except urllib.error.HTTPError:
+            return True
+        except Exception:
+            return False
+
+    def check_all(self) -> None:
+        with self._lock:
+            urls = list(self._urls)
+        for url in urls:
+            up = self.check(url)
+            if self.state.get(url) != up:
+                log.info("Call provider %s is %s", url, "reachable" if up else "unreachable")
+            self.state[url] = up
+
+    def _run(self) -> None:
+        try:
+            from presence import wait_background_active
+        except ImportError:
+            wait_background_active = lambda: True
+        while True:
+            # While nobody is there, block until presence returns, then check right away
+            # so the first press does not route on hours-old state
+            wait_background_active()
+            self._wake.clear()  # this check covers any wake-up that came in meanwhile
+            self.check_all()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def get_monitor(interval: float = 60.0) -> HealthMonitor:
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = HealthMonitor(interval=interval)
+        return _monitor
+
+
+class CallRouter:
+    """Primary + optional fallback call, with failover based on the last health check."""
+
+    def __init__(self, cfg: dict, monitor: HealthMonitor | None = None):
+        local_base = cfg.get("local_call_base", "")
+        self.primary = resolve_call(cfg.get("video_call_url", ""), cfg.get("video_call_password", ""), local_base)
+        self.fallback = resolve_call(
+            cfg.get("video_call_fallback_url", ""), cfg.get("video_call_fallback_password", ""), local_base
+        )
+        self.monitor = monitor or get_monitor(cfg.get("provider_check_secs", 60.0))
+        self._health = {}
+        for name, url in (self.primary, self.fallback):
+            if not url:
+                continue
+            try:
+                self._health[url] = provider_by_name(name).health_url(url)
+            except ValueError:
+                continue  # unparseable URL: no health state, so it is always tried
+            self.monitor.watch(self._health[url])
+
+    def _is_up(self, url: str) -> bool | None:
+        return self.monitor.is_up(self._health[url]) if url in self._health else None
+
+    def launch_url(self) -> str:
+        """URL to open now. Never blocks: uses the last known health state."""
+        primary, fallback = self.primary[1], self.fallback[1]
+        if not fallback or self._is_up(primary) is not False:
+            return primary
+        if self._is_up(fallback) is not False:
+            log.info("Primary call provider unreachable; using fallback (%s)", self.fallback[0])
+            return fallback
+        return primary
+
+
+@functools.lru_cache(maxsize=4)
+def _router(key: tuple) -> CallRouter:
+    return CallRouter(dict(key))
+
+
+ROUTER_KEYS = (
+    "video_call_url",
+    "video_call_password",
+    "video_call_fallback_url",
+    "video_call_fallback_password",
+    "local_call_base",
+    "provider_check_secs",
+)
+
+
+def get_router(cfg: dict) -> CallRouter:
+    """CallRouter for this config, built once per distinct call settings."""
+    return _router(tuple((k, cfg.get(k)) for k in ROUTER_KEYS if cfg.get(k) not in (None, "")))
@@ -5,7 +5,6 @@ Load DogPhone config from environment or config.env file.
 VERSION = "1.0.0"
 
 import os
-from urllib.parse import quote_plus
 from pathlib import Path
 
 # Prefer repo root config; fallback to pi/config.env or env vars only
@@ -36,27 +35,34 @@ def load_config() -> dict:
     return {
         "video_call_url": os.environ.get("VIDEO_CALL_URL", "").strip(),
         "video_call_password": os.environ.get("VIDEO_CALL_PASSWORD", "").strip(),
+        "video_call_fallback_url": os.environ.get("VIDEO_CALL_FALLBACK_URL", "").strip(),
+        "video_call_fallback_password": os.environ.get("VIDEO_CALL_FALLBACK_PASSWORD", "").strip(),
+        "local_call_base": os.environ.get("LOCAL_CALL_BASE", "").strip(),
+        "provider_check_secs": float(os.environ.get("PROVIDER_CHECK_SECS", "60")),
+        "telegram_bot_token": os.environ.get("TELEGRAM_BOT_TOKEN", "").strip(),
+        "telegram_chat_id": os.environ.get("TELEGRAM_CHAT_ID", "").strip(),
         "button_gpio": int(os.environ.get("BUTTON_GPIO", "17")),
         "servo_gpio": int(os.environ.get("SERVO_GPIO", "27")),
         "servo_pulse_min": float(os.environ.get("SERVO_PULSE_MIN", "0.5")),
         "servo_pulse_max": float(os.environ.get("SERVO_PULSE_MAX", "2.5")),
         "setup_port": int(os.environ.get("SETUP_PORT", "8765")),
+        "presence_source": os.environ.get("PRESENCE_SOURCE", "").strip(),
+        "presence_fps": float(os.environ.get("PRESENCE_FPS", "2")),
+        "presence_absent_secs": float(os.environ.get("PRESENCE_ABSENT_SECS", "120")),
+        "debug_token": os.environ.get("DEBUG_TOKEN", "").strip(),
+        "status_host": os.environ.get("STATUS_HOST", "127.0.0.1").strip(),
+        "fleet_token": os.environ.get("FLEET_TOKEN", "").strip(),
+        # URL fetched to decide "has internet" (status page, setup wizard, offline queue)
+        "internet_probe_url": os.environ.get("INTERNET_PROBE_URL", "").strip() or "https://api.telegram.org",
+        "data_dir": os.environ.get("DATA_DIR", "").strip() or str(Path(__file__).resolve().parent.parent / "data"),
     }
 
 
 def get_call_url(cfg: dict) -> str:
-    """URL to open for the video call (Zoom, Whereby, etc.). Optionally append VIDEO_CALL_PASSWORD as ?pwd= or &pwd=."""
-    raw = (cfg.get("video_call_url") or "").strip()
-    if not raw:
-        return ""
-    # If it looks like a Zoom meeting ID (digits, maybe with spaces/dashes), use zoom.us/j/
-    meeting_id = raw.replace(" ", "").replace("-", "").replace("\u00a0", "")
-    if meeting_id.isdigit():
-        raw = f"https://zoom.us/j/{meeting_id}"
-    elif not raw.startswith("http://") and not raw.startswith("https://"):
-        raw = "https://" + raw
-    password = (cfg.get("video_call_password") or "").strip()
-    if password:
-        sep = "&" if "?" in raw else "?"
-        raw = f"{raw}{sep}pwd={quote_plus(password)}"
-    return raw
+    """URL to open for the video call (Zoom, Whereby, Jitsi, local room, ...), memoized. See call_providers.py."""
+    from call_providers import resolve_call
+    return resolve_call(
+        cfg.get("video_call_url") or "",
+        cfg.get("video_call_password") or "",
+        cfg.get("local_call_base") or "",
+    )[1]
@@ -0,0 +1,249 @@
+"""
+DogPhone on-demand diagnostics: guarded /debug/* endpoints for live devices.
+
+- /debug/profile?seconds=10     sampling CPU profile of all threads (collapsed stacks, flamegraph.pl-ready)
+- /debug/tracemalloc?seconds=10 top allocators during the window (&top=25)
+- /debug/threads                stack dump of every thread
+- /debug/proc                   RSS, open fds, threads, child processes, Chromium processes
+
+Disabled unless DEBUG_TOKEN is set; every request must pass it as ?token= or an
+X-Debug-Token header. Nothing runs between requests: the profiler samples and
+tracemalloc traces only for the requested window.
+
+The main app listens on 127.0.0.1 only. The status server forwards
+/debug/main/<endpoint> to it, so when STATUS_HOST exposes the status server on the
+LAN, both processes can be inspected without SSH (otherwise tunnel port 8767).
+"""
+import hmac
+import math
+import os
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+MAX_PROFILE_SECS = 60
+_profile_lock = threading.Lock()
+_tracemalloc_lock = threading.Lock()
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> Counter:
+    """Sample all threads' stacks for `seconds`. Returns Counter of collapsed stack -> samples."""
+    me = threading.get_ident()
+    counts = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            counts[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return counts
+
+
+def collapsed(counts: Counter) -> str:
+    """Brendan Gregg's collapsed format: 'frame;frame;frame count' per line."""
+    return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+
+
+def thread_dump() -> str:
+    names = {t.ident: (t.name, t.daemon) for t in threading.enumerate()}
+    out = []
+    for ident, frame in sys._current_frames().items():
+        name, daemon = names.get(ident, (f"thread-{ident}", None))
+        out.append(f'Thread "{name}" id={ident}{" daemon" if daemon else ""}\n')
+        out.extend(traceback.format_stack(frame))
+        out.append("\n")
+    return "".join(out)
+
+
+def tracemalloc_window(seconds: float, top: int = 25) -> dict:
+    """Trace allocations for `seconds` and return the top growth by line; tracing stops afterwards."""
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(10)
+    try:
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        before = tracemalloc.take_snapshot().filter_traces(ignore)
+        time.sleep(seconds)
+        after = tracemalloc.take_snapshot().filter_traces(ignore)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started:
+            tracemalloc.stop()
+    return {
+        "seconds": seconds,
+        "traced_kb": current // 1024,
+        "peak_kb": peak // 1024,
+        "top": [
+            {
+                "where": str(s.traceback[0]),
+                "size_kb": round(s.size / 1024, 1),
+                "size_diff_kb": round(s.size_diff / 1024, 1),
+                "count": s.count,
+                "count_diff": s.count_diff,
+            }
+            for s in after.compare_to(before, "lineno")[:top]
+        ],
+    }
+
+
+def _read_proc_stat(pid: int) -> tuple[str, int] | None:
+    """(comm, ppid) from /proc/<pid>/stat, or None if gone."""
+    try:
+        data = Path(f"/proc/{pid}/stat").read_text()
+    except OSError:
+        return None
+    # comm may contain spaces/parens: take text between first '(' and last ')'
+    comm = data[data.index("(") + 1:data.rindex(")")]
+    ppid = int(data[data.rindex(")") + 2:].split()[1])
+    return comm, ppid
+
+
+def process_info() -> dict:
+    """RSS, fd/thread counts, descendant processes and Chromium processes (possibly leaked by open_browser)."""
+    rss_kb = 0
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss_kb = int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        fds = len(os.listdir("/proc/self/fd"))
+    except OSError:
+        fds = None
+    procs = {}
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if entry.isdigit():
+            info = _read_proc_stat(int(entry))
+            if info:
+                procs[int(entry)] = info
+    # Walk descendants of this process (browser launches are fire-and-forget Popen children)
+    children = []
+    todo = [os.getpid()]
+    while todo:
+        parent = todo.pop()
+        for pid, (comm, ppid) in procs.items():
+            if ppid == parent:
+                children.append({"pid": pid, "ppid": ppid, "name": comm})
+                todo.append(pid)
+    chromium = [pid for pid, (comm, _) in procs.items() if "chrom" in comm.lower()]
+    return {
+        "pid": os.getpid(),
+        "rss_kb": rss_kb,
+        "fds": fds,
+        "threads": threading.active_count(),
+        "children": len(children),
+        "child_processes": children,
+        "chromium_processes": len(chromium),
+        "tracemalloc": tracemalloc.is_tracing(),
+    }
+
+
+def _check_token(token: str) -> None:
+    from flask import abort, request
+    given = request.args.get("token") or request.headers.get("X-Debug-Token") or ""
+    if not hmac.compare_digest(given.encode(), token.encode()):
+        abort(404)
+
+
+def _number_arg(name: str, default, cast, lo, hi):
+    """Query parameter as a number clamped to [lo, hi]; 400 if it is not a number."""
+    from flask import abort, request
+    try:
+        value = cast(request.args.get(name, default))
+    except (TypeError, ValueError):
+        abort(400, description=f"{name} must be a number")
+    if not math.isfinite(value):
+        abort(400, description=f"{name} must be a number")
+    return min(max(value, lo), hi)
+
+
+def register_debug_routes(app, token: str) -> None:
+    """Add /debug/* routes to a Flask app. No-op when token is empty."""
+    if not token:
+        return
+    from flask import Response, jsonify, request
+
+    def check_token():
+        _check_token(token)
+
+    @app.route("/debug/profile")
+    def debug_profile():
+        check_token()
+        seconds = _number_arg("seconds", 10, float, 0, MAX_PROFILE_SECS)
+        interval = _number_arg("interval", 0.005, float, 0.001, 1)
+        if not _profile_lock.acquire(blocking=False):
+            return "Profile already running\n", 409
+        try:
+            counts = sample_stacks(seconds, interval)
+        finally:
+            _profile_lock.release()
+        resp = Response(collapsed(counts), mimetype="text/plain")
+        if request.args.get("download"):
+            resp.headers["Content-Disposition"] = f"attachment; filename=dogphone-{os.getpid()}.collapsed"
+        return resp
+
+    @app.route("/debug/tracemalloc")
+    def debug_tracemalloc():
+        check_token()
+        seconds = _number_arg("seconds", 10, float, 0, MAX_PROFILE_SECS)
+        top = _number_arg("top", 25, int, 1, 500)
+        if not _tracemalloc_lock.acquire(blocking=False):
+            return "Trace already running\n", 409
+        try:
+            return jsonify(tracemalloc_window(seconds, top))
+        finally:
+            _tracemalloc_lock.release()
+
+    @app.route("/debug/threads")
+    def debug_threads():
+        check_token()
+        return Response(thread_dump(), mimetype="text/plain")
+
+    @app.route("/debug/proc")
+    def debug_proc():
+        check_token()
+        return jsonify(process_info())
+
+
+def register_debug_forward(app, token: str, name: str, base_url: str) -> None:
+    """Add /debug/<name>/<endpoint> forwarding to another local server's /debug/<endpoint>. No-op without token."""
+    if not token:
+        return
+    import urllib.error
+    import urllib.request
+    from urllib.parse import urlencode
+    from flask import Response, request
+
+    @app.route(f"/debug/{name}/<endpoint>", endpoint=f"debug_forward_{name}")
+    def debug_forward(endpoint):
+        _check_token(token)
+        query = urlencode([(k, v) for k, v in request.args.items(multi=True) if k != "token"])
+        req = urllib.request.Request(
+            f"{base_url}/debug/{endpoint}" + (f"?{query}" if query else ""),
+            headers={"X-Debug-Token": token},
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=MAX_PROFILE_SECS + 10) as r:
+                body, status, headers = r.read(), r.status, r.headers
+        except urllib.error.HTTPError as e:
+            body, status, headers = e.read(), e.code, e.headers
+        except OSError as e:
+            return f"{name} not reachable: {e}\n", 502
+        resp = Response(body, status=status, content_type=headers.get("Content-Type") or "text/plain")
+        if headers.get("Content-Disposition"):
+            resp.headers["Content-Disposition"] = headers["Content-Disposition"]
+        return resp
@@ -15,6 +15,19 @@ from config import load_config, VERSION
 
 SETUP_PORT = 8765
 STATUS_PORT = 8767
+MAIN_PORT = 8766
+_queue = None
+# git pull errors that mean "no network right now" (retry later) rather than a broken checkout
+NETWORK_ERRORS = (
+    "timed out",
+    "could not resolve",
+    "unable to access",
+    "failed to connect",
+    "connection refused",
+    "connection timed out",
+    "network is unreachable",
+    "could not read from remote repository",
+)
 BROWSER_CMD = ["chromium-browser", "--kiosk", "--noerrdialogs", "--disable-infobars"]
 
 
@@ -31,7 +44,7 @@ def start_setup_server():
         from flask import Flask
         cfg = load_config()
         port = cfg.get("setup_port", SETUP_PORT)
-        app = create_app()
+        app = create_app(queue_update=queue_update)
         def run():
             app.run(host="0.0.0.0", port=port, debug=False, use_reloader=False, threaded=True)
         t = threading.Thread(target=run, daemon=True)
@@ -95,11 +108,42 @@ def start_wifi_ap():
         pass
 
 
+def get_queue():
+    """Launcher's offline action queue (deferred updates), created on first use."""
+    global _queue
+    if _queue is None:
+        from action_queue import ActionQueue, internet_ok
+        from update_check import run_update
+
+        def send_updates(items) -> bool:
+            ok, msg = run_update()
+            print("Queued update:", msg, file=sys.stderr)
+            # False = retry later: only network problems; other failures will not fix themselves
+            return ok or not any(err in msg.lower() for err in NETWORK_ERRORS)
+
+        cfg = load_config()
+        _queue = ActionQueue(
+            Path(cfg["data_dir"]) / "launcher-queue.log",
+            probe=lambda: internet_ok(cfg["internet_probe_url"]),
+        )
+        _queue.register("update", send_updates)
+        _queue.start()
+    return _queue
+
+
+def queue_update() -> None:
+    """Run git pull once the internet is back (repeated requests collapse into one)."""
+    get_queue().enqueue("update", dedup_key="update", ttl=7 * 86400)
+
+
 def try_startup_update():
-    """If this is a git repo and we have network, pull latest (non-blocking, best-effort)."""
+    """If this is a git repo, pull latest (best-effort); if offline, queue it for when the network is back."""
     repo_root = Path(__file__).resolve().parent.parent
     if not (repo_root / ".git").exists():
         return
+    if not get_network_info()[1]:
+        queue_update()
+        return
     try:
         subprocess.run(
             ["git", "pull", "origin", "main"],
@@ -107,8 +151,8 @@ def try_startup_update():
             capture_output=True,
             timeout=30,
         )
-    except Exception:
-        pass
+    except Exception as e:
+        print("Startup update failed:", e, file=sys.stderr)
 
 
 def get_network_info():
@@ -128,71 +172,166 @@ def get_network_info():
     ips_str = " ".join(ips) if ips else "—"
     try:
         import urllib.request
-        urllib.request.urlopen("https://api.telegram.org", timeout=3)
+        urllib.request.urlopen(load_config()["internet_probe_url"], timeout=3)
         return ips_str, True
     except Exception:
         return ips_str, False
 
 
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        import ipaddress
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def status_bind_host(cfg: dict) -> str:
+    """STATUS_HOST, or 127.0.0.1 if it is not loopback and FLEET_TOKEN is unset."""
+    host = cfg.get("status_host") or "127.0.0.1"
+    if not _is_loopback(host) and not cfg.get("fleet_token"):
+        print(f"STATUS_HOST={host} needs FLEET_TOKEN; serving the status page on 127.0.0.1 only", file=sys.stderr)
+        return "127.0.0.1"
+    return host
+
+
+def status_connect_host(cfg: dict) -> str:
+    """Address to reach this device's status server at (wildcard binds are reachable on loopback)."""
+    host = status_bind_host(cfg)
+    return "127.0.0.1" if host in ("0.0.0.0", "::", "") else host
+
+
+def create_status_app():
+    """Flask app for the status page (network, call URL, Test call link)."""
+    import hmac
+    from flask import Flask, abort, jsonify, request
+    app = Flask(__name__)
+    html_path = Path(__file__).resolve().parent / "status_page.html"
+
+    def is_main_up() -> bool:
+        try:
+            import urllib.request
+            urllib.request.urlopen(f"http://127.0.0.1:{MAIN_PORT}/", timeout=2)
+            return True
+        except Exception:
+            return False
+
+    # Everything here except /debug/* is open to localhost (the kiosk browser) and
+    # otherwise needs FLEET_TOKEN; STATUS_HOST is only honoured when FLEET_TOKEN is set.
+    def check_fleet_token():
+        cfg = load_config()
+        addr = request.remote_addr or ""
+        # The device itself (kiosk browser, local scripts); with STATUS_HOST=<LAN IP> it connects from that IP
+        if _is_loopback(addr) or addr == cfg.get("status_host"):
+            return
+        token = cfg.get("fleet_token", "")
+        given = request.headers.get("X-Fleet-Token") or request.args.get("token") or ""
+        if not token or not hmac.compare_digest(given.encode(), token.encode()):
+            abort(403)
+
+    @app.route("/api/main-up")
+    def main_up():
+        check_fleet_token()
+        return "1" if is_main_up() else "0"
+
+    @app.route("/api/version")
+    def api_version():
+        check_fleet_token()
+        return jsonify({"version": VERSION})
+
+    @app.route("/api/device")
+    def api_device():
+        check_fleet_token()
+        cfg = load_config()
+        ips, internet_ok = get_network_info()
+        return jsonify({
+            "version": VERSION,
+            "configured": bool(cfg.get("video_call_url")),
+            "main_up": is_main_up(),
+            "internet": internet_ok,
+            "ips": ips,
+        })
+
+    @app.route("/api/metrics")
+    def api_metrics():
+        check_fleet_token()
+        from diagnostics import process_info
+        info = process_info()
+        info.pop("child_processes", None)
+        info["load_1m"] = os.getloadavg()[0] if hasattr(os, "getloadavg") else None
+        return jsonify(info)
+
+    @app.route("/api/update", methods=["POST"])
+    def api_update():
+        check_fleet_token()
+        if not get_network_info()[1]:
+            queue_update()
+            return jsonify({"ok": True, "queued": True, "message": "Offline; update queued."})
+        from update_check import run_update
+        ok, msg = run_update()
+        return jsonify({"ok": ok, "message": msg})
+
+    @app.route("/")
+    def status():
+        # Shows the call URL (with any password), so not for the whole LAN
+        check_fleet_token()
+        cfg = load_config()
+        ips, internet_ok = get_network_info()
+        internet_status = "yes" if internet_ok else "no"
+        internet_class = "ok" if internet_ok else "warn"
+        video_call_url = cfg.get("video_call_url", "—") or "—"
+        has_call_url = bool(cfg.get("video_call_url"))
+        setup_port = cfg.get("setup_port", 8765)
+        first_ip = "127.0.0.1"
+        if ips and ips != "—":
+            parts = ips.split()
+            if parts:
+                first_ip = parts[0]
+        setup_url = f"http://{first_ip}:{setup_port}/setup"
+        html = open(html_path).read()
+        html = html.replace("{{ version }}", VERSION)
+        html = html.replace("{{ network_ips }}", ips or "—")
+        html = html.replace("{{ internet_status }}", internet_status)
+        html = html.replace("{{ internet_class }}", internet_class)
+        html = html.replace("{{ video_call_url }}", video_call_url)
+        html = html.replace("{{ setup_url }}", setup_url)
+        html = html.replace("{{ has_call_url }}", "true" if has_call_url else "false")
+        return html
+
+    from diagnostics import register_debug_routes, register_debug_forward
+    debug_token = load_config().get("debug_token", "")
+    register_debug_routes(app, debug_token)
+    # The main app only listens on localhost; reach its /debug/* through this server
+    register_debug_forward(app, debug_token, "main", f"http://127.0.0.1:{MAIN_PORT}")
+    return app
+
+
 def run_status_server():
     """Serve the status page (network, Telegram config, Test call link) on STATUS_PORT."""
     try:
-        from flask import Flask
-        app = Flask(__name__)
-        html_path = Path(__file__).resolve().parent / "status_page.html"
-
-        @app.route("/api/main-up")
-        def main_up():
-            try:
-                import urllib.request
-                urllib.request.urlopen(f"http://127.0.0.1:8766/", timeout=2)
-                return "1"
-            except Exception:
-                return "0"
-
-        @app.route("/")
-        def status():
-            cfg = load_config()
-            ips, internet_ok = get_network_info()
-            internet_status = "yes" if internet_ok else "no"
-            internet_class = "ok" if internet_ok else "warn"
-            video_call_url = cfg.get("video_call_url", "—") or "—"
-            has_call_url = bool(cfg.get("video_call_url"))
-            setup_port = cfg.get("setup_port", 8765)
-            first_ip = "127.0.0.1"
-            if ips and ips != "—":
-                parts = ips.split()
-                if parts:
-                    first_ip = parts[0]
-            setup_url = f"http://{first_ip}:{setup_port}/setup"
-            html = open(html_path).read()
-            html = html.replace("{{ version }}", VERSION)
-            html = html.replace("{{ network_ips }}", ips or "—")
-            html = html.replace("{{ internet_status }}", internet_status)
-            html = html.replace("{{ internet_class }}", internet_class)
-            html = html.replace("{{ video_call_url }}", video_call_url)
-            html = html.replace("{{ setup_url }}", setup_url)
-            html = html.replace("{{ has_call_url }}", "true" if has_call_url else "false")
-            return html
-
-        app.run(host="127.0.0.1", port=STATUS_PORT, debug=False, use_reloader=False)
+        app = create_status_app()
+        app.run(host=status_bind_host(load_config()), port=STATUS_PORT, debug=False, use_reloader=False)
     except Exception as e:
         print("Status server failed:", e, file=sys.stderr)
 
 
 def main():
-    try_startup_update()
     # If status server is already running, another launcher instance is up; exit
     try:
         import socket
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         s.settimeout(1)
-        s.connect(("127.0.0.1", STATUS_PORT))
+        s.connect((status_connect_host(load_config()), STATUS_PORT))
         s.close()
         return
     except Exception:
         pass
 
+    # After the instance check: only the running launcher may write its queue log
+    try_startup_update()
+
     # Start status server first so the page is ready when we open the browser
     t = threading.Thread(target=run_status_server, daemon=True)
     t.start()
@@ -224,7 +363,7 @@ def main():
         stderr=subprocess.DEVNULL,
     )
     time.sleep(3)
-    open_browser(f"http://127.0.0.1:{STATUS_PORT}/")
+    open_browser(f"http://{status_connect_host(load_config())}:{STATUS_PORT}/")
     try:
         while True:
             time.sleep(60)
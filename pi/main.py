@@ -2,8 +2,10 @@
 """
 DogPhone – Raspberry Pi main app.
 
-- Button press: open Zoom video call in browser (no Telegram).
+- Button press: open the video call in the browser; with TELEGRAM_BOT_TOKEN/TELEGRAM_CHAT_ID set,
+  also queue a Telegram notification (sent and batched when the internet is up).
 - Treat: use Zoom (e.g. raise hand / message in meeting) or the "Dispense treat" button on the status page.
+- Presence (optional, PRESENCE_SOURCE): blank the screen when nobody is there, wake the network path to the call when the dog comes.
 
 Run: python main.py
 """
@@ -12,11 +14,15 @@ import os
 import subprocess
 import sys
 import threading
+import time
 from pathlib import Path
+from urllib.parse import urlparse
 
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
 from config import load_config, get_call_url, VERSION
+from call_providers import get_router
+from diagnostics import register_debug_routes
 
 logging.basicConfig(
     level=logging.INFO,
@@ -33,7 +39,17 @@ except ImportError:
     GPIO = None
 
 CONTROL_PORT = 8766
+SERVO_HOLD_SECS = 0.5
 _cfg = None
+_queue = None
+_presence = None
+_camera_device = ""
+
+# Telegram text and how long a queued notification stays worth sending (seconds)
+NOTIFICATIONS = {
+    "button_pressed": ("🐶 Your dog pressed the button", 6 * 3600),
+    "treat_dispensed": ("🦴 Treat dispensed", 24 * 3600),
+}
 
 
 def run_servo_once(cfg: dict) -> None:
@@ -50,15 +66,61 @@ def run_servo_once(cfg: dict) -> None:
         pwm.start(0)
         duty = (cfg["servo_pulse_min"] + cfg["servo_pulse_max"]) / 2
         pwm.ChangeDutyCycle(duty)
-        import time
-        time.sleep(0.5)
+        time.sleep(SERVO_HOLD_SECS)
         pwm.ChangeDutyCycle(0)
         pwm.stop()
         log.info("Servo triggered (treat dispensed)")
+        notify("treat_dispensed")
     except Exception as e:
         log.warning("Servo trigger failed: %s", e)
 
 
+def send_telegram_batch(cfg: dict, items: list) -> bool:
+    """Send a batch of queued notifications as one Telegram message."""
+    import json
+    import urllib.request
+    lines = []
+    for item in items:
+        event = item["payload"].get("event", "")
+        text = NOTIFICATIONS.get(event, (event, 0))[0]
+        last = time.strftime("%H:%M", time.localtime(item["last"]))
+        if item["count"] > 1:
+            lines.append(f"{text} ({item['count']}×, last at {last})")
+        else:
+            lines.append(f"{text} at {last}")
+        if item["payload"].get("url"):
+            lines.append(f"Join: {item['payload']['url']}")
+    req = urllib.request.Request(
+        f"https://api.telegram.org/bot{cfg['telegram_bot_token']}/sendMessage",
+        data=json.dumps({"chat_id": cfg["telegram_chat_id"], "text": "\n".join(lines)}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(req, timeout=10) as r:
+        return json.load(r).get("ok", False)
+
+
+def notify(event: str, **payload) -> None:
+    """Queue a Telegram notification; delivered (and coalesced) when the internet is up."""
+    if _queue is None:
+        return
+    ttl = NOTIFICATIONS.get(event, ("", 3600))[1]
+    _queue.enqueue("notify", {"event": event, **payload}, dedup_key=event, ttl=ttl)
+
+
+def setup_action_queue(cfg: dict) -> None:
+    """Start the offline action queue if Telegram notifications are configured."""
+    global _queue
+    if not cfg.get("telegram_bot_token") or not cfg.get("telegram_chat_id"):
+        return
+    from action_queue import ActionQueue, internet_ok
+    _queue = ActionQueue(
+        Path(cfg["data_dir"]) / "main-queue.log",
+        probe=lambda: internet_ok(cfg["internet_probe_url"]),
+    )
+    _queue.register("notify", lambda items: send_telegram_batch(cfg, items))
+    _queue.start()
+
+
 def open_video_call_in_browser(url: str) -> None:
     """Open video call URL in Chromium (kiosk) so camera/mic are used for the call."""
     display = os.environ.get("DISPLAY", ":0")
@@ -69,8 +131,13 @@ def open_video_call_in_browser(url: str) -> None:
         "--use-fake-ui-for-media-stream",
         url,
     ]
+    if _camera_device:
+        # Presence capture shares the camera: free it before Chromium asks for it
+        from presence import release_camera
+        release_camera()
+    proc = None
     try:
-        subprocess.Popen(
+        proc = subprocess.Popen(
             cmd,
             env={**os.environ, "DISPLAY": display},
             stdout=subprocess.DEVNULL,
@@ -79,7 +146,7 @@ def open_video_call_in_browser(url: str) -> None:
         log.info("Opened video call in browser: %s", url)
     except FileNotFoundError:
         try:
-            subprocess.Popen(
+            proc = subprocess.Popen(
                 ["xdg-open", url],
                 env={**os.environ, "DISPLAY": display},
                 stdout=subprocess.DEVNULL,
@@ -87,6 +154,9 @@ def open_video_call_in_browser(url: str) -> None:
             )
         except FileNotFoundError:
             log.warning("Could not open browser; open this URL on your phone: %s", url)
+    if _camera_device:
+        from presence import reclaim_camera_after
+        reclaim_camera_after(proc, _camera_device)
 
 
 def _on_button_press():
@@ -94,9 +164,13 @@ def _on_button_press():
     global _cfg
     if not _cfg:
         return
-    url = get_call_url(_cfg)
+    url = get_router(_cfg).launch_url()
     if url:
+        if _presence is not None and not _presence.present:
+            # Detector missed the dog walking up, so the screen is blanked; unblank off the press path
+            threading.Thread(target=_presence.mark_present, daemon=True).start()
         open_video_call_in_browser(url)
+        notify("button_pressed", url=url)
 
 
 def setup_gpio_button(cfg: dict) -> None:
@@ -117,6 +191,44 @@ def setup_gpio_button(cfg: dict) -> None:
     t.start()
 
 
+def prewarm_call_path(url: str) -> None:
+    """HEAD the call URL ahead of a press (DNS, TCP and TLS to the call host).
+
+    This wakes the WiFi link and fills the router's / upstream DNS caches and the
+    provider's edge; Chromium keeps its own host cache, which is not touched.
+    """
+    if not urlparse(url).hostname:
+        return
+    def head():
+        import urllib.error
+        import urllib.request
+        try:
+            urllib.request.urlopen(urllib.request.Request(url, method="HEAD"), timeout=5).close()
+        except urllib.error.HTTPError:
+            pass  # the host answered; that is all we wanted
+        except Exception as e:
+            log.info("Pre-warm of %s failed: %s", url, e)
+            return
+        log.info("Pre-warmed call path to %s", urlparse(url).hostname)
+    threading.Thread(target=head, daemon=True).start()
+
+
+def setup_presence(cfg: dict) -> None:
+    """Blank the screen / pause background checks when nobody is there; pre-warm the call path when the dog comes."""
+    global _presence, _camera_device
+    from presence import start_presence_thread, set_display_power, set_background_active, is_capture_device
+
+    def on_presence(present: bool) -> None:
+        if present:
+            url = get_router(cfg).launch_url()
+            if url:
+                prewarm_call_path(url)
+
+    _presence = start_presence_thread(cfg, [set_display_power, set_background_active, on_presence])
+    if _presence is not None and is_capture_device(cfg["presence_source"]):
+        _camera_device = cfg["presence_source"]
+
+
 def create_app(cfg: dict):
     from flask import Flask
     app = Flask(__name__)
@@ -130,7 +242,7 @@ def create_app(cfg: dict):
 
     @app.route("/trigger-call")
     def trigger_call():
-        url = get_call_url(cfg)
+        url = get_router(cfg).launch_url()
         if not url:
             return "<h1>Not configured</h1><p>Set VIDEO_CALL_URL in config.</p>", 503
         open_video_call_in_browser(url)
@@ -148,6 +260,7 @@ def create_app(cfg: dict):
             "<h1>Treat dispensed</h1><p><a href='/'>Back</a></p></body></html>"
         )
 
+    register_debug_routes(app, cfg.get("debug_token", ""))
     return app
 
 
@@ -161,8 +274,12 @@ def main() -> None:
         log.error("Set VIDEO_CALL_URL in config (e.g. your Zoom Meeting ID or URL).")
         sys.exit(1)
     log.info("Call URL: %s", call_url)
+    # Start provider health checks now so the first press already has a reachability state
+    get_router(cfg)
 
+    setup_action_queue(cfg)
     setup_gpio_button(cfg)
+    setup_presence(cfg)
 
     log.info("DogPhone running. Press the button to call (or use Test call on status page). Treat: use Zoom or Dispense on status page.")
 
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+DogPhone presence detection: is the dog in front of the device?
+
+Grabs small grayscale frames at a low rate (a few per second) and compares each
+one to a slowly adapting background with NumPy (no per-pixel Python loops).
+When presence changes, listeners are called with True/False:
+- the display is blanked / unblanked via DPMS (xset),
+- the background gate is cleared / set; loops in the main app process check it
+  (call_providers.py skips reachability checks while nobody is there). The launcher
+  runs in its own process and is not affected,
+- the main app can wake the network path to the call host when the dog walks up.
+
+Frames come from ffmpeg (camera device or video file) or a directory of frames
+(.npy or binary .pgm; other image formats are decoded with ffmpeg).
+
+A camera device is shared with the call: V4L2 lets only one process stream, so
+Chromium would get EBUSY while ffmpeg holds it. The main app calls release_camera()
+before opening the call and reclaim_camera_after() to resume capture once the
+browser has exited and nothing else has the device open. No presence changes are
+reported while capture is paused.
+
+Test with recorded input:
+  python presence.py /path/to/frames_dir
+  python presence.py /path/to/clip.mp4
+"""
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+    np = None
+
+log = logging.getLogger("dogphone.presence")
+
+FRAME_WIDTH = 64
+FRAME_HEIGHT = 48
+FRAME_EXTS = {".npy", ".pgm", ".png", ".jpg", ".jpeg", ".bmp"}
+
+# Set while someone is present (or presence detection is off); cleared when the
+# device is idle. Background loops should check this before doing network work.
+_background_active = threading.Event()
+_background_active.set()
+
+# Set while presence capture may use the camera; cleared while a call needs it.
+_camera_lock = threading.Lock()
+_camera_free = threading.Event()
+_camera_free.set()
+_camera_proc = None
+_camera_generation = 0
+
+
+def background_active() -> bool:
+    """True if background work (probes, refreshes) should run now."""
+    return _background_active.is_set()
+
+
+def wait_background_active(timeout: float | None = None) -> bool:
+    """Block until background work is allowed again (or timeout). Returns background_active()."""
+    return _background_active.wait(timeout)
+
+
+def set_background_active(active: bool) -> None:
+    if active:
+        _background_active.set()
+    else:
+        _background_active.clear()
+
+
+def set_display_power(on: bool) -> None:
+    """Blank or unblank the display via DPMS (X11 xset)."""
+    display = os.environ.get("DISPLAY", ":0")
+    try:
+        subprocess.run(
+            ["xset", "dpms", "force", "on" if on else "off"],
+            env={**os.environ, "DISPLAY": display},
+            capture_output=True,
+            timeout=5,
+        )
+        if on:
+            # Also reset the screensaver so it does not blank again right away
+            subprocess.run(
+                ["xset", "s", "reset"],
+                env={**os.environ, "DISPLAY": display},
+                capture_output=True,
+                timeout=5,
+            )
+    except Exception as e:
+        log.warning("DPMS %s failed: %s", "on" if on else "off", e)
+
+
+def is_capture_device(source: str) -> bool:
+    return source.startswith("/dev/")
+
+
+def device_in_use(device: str) -> bool:
+    """True if any process has the device open (scans /proc/<pid>/fd)."""
+    target = os.path.realpath(device)
+    for fd_dir in Path("/proc").glob("[0-9]*/fd"):
+        try:
+            for fd in fd_dir.iterdir():
+                if os.readlink(fd) == target:
+                    return True
+        except OSError:
+            continue
+    return False
+
+
+def release_camera() -> None:
+    """Stop capturing now (ffmpeg is killed) so the call can open the camera."""
+    global _camera_generation
+    with _camera_lock:
+        _camera_generation += 1
+        _camera_free.clear()
+        proc = _camera_proc
+    if proc is not None and proc.poll() is None:
+        proc.kill()
+        try:
+            proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            log.warning("ffmpeg did not exit; the camera may still be busy")
+
+
+def reclaim_camera_after(proc, device: str, min_secs: float = 30.0) -> None:
+    """Resume capture once proc has exited and nothing has device open (checked every few seconds)."""
+    with _camera_lock:
+        generation = _camera_generation
+
+    def wait():
+        started = time.monotonic()
+        if proc is not None:
+            proc.wait()
+        # chromium-browser may hand the URL to a running instance and exit right away,
+        # so also wait until no process holds the camera
+        while time.monotonic() - started < min_secs or device_in_use(device):
+            time.sleep(5)
+        with _camera_lock:
+            # A newer call released the camera again: that call's watcher resumes
+            if generation == _camera_generation:
+                _camera_free.set()
+                log.info("Camera free again; presence capture resumed")
+
+    threading.Thread(target=wait, daemon=True).start()
+
+
+class PresenceDetector:
+    """
+    Frame-differencing presence detector over a fixed-size grayscale buffer.
+
+    feed() takes a uint8 frame of shape (height, width) and a timestamp in seconds.
+    A frame counts as motion when more than min_fraction of its pixels differ from
+    the background by more than threshold. Presence starts on motion and ends
+    after absent_after seconds without motion.
+    """
+
+    def __init__(
+        self,
+        width: int = FRAME_WIDTH,
+        height: int = FRAME_HEIGHT,
+        threshold: float = 18.0,
+        min_fraction: float = 0.02,
+        absent_after: float = 120.0,
+        alpha: float = 0.05,
+    ):
+        self.shape = (height, width)
+        self.threshold = threshold
+        self.min_fraction = min_fraction
+        self.absent_after = absent_after
+        self.alpha = alpha
+        self.present = True
+        self.last_motion = None
+        self.listeners = []
+        # feed() runs on the capture thread, mark_present() on the button thread;
+        # held while listeners run so changes are reported once and in order
+        self._lock = threading.RLock()
+        self._background = None
+        self._diff = np.empty(self.shape, dtype=np.float32)
+        self._mask = np.empty(self.shape, dtype=bool)
+
+    def add_listener(self, callback) -> None:
+        """callback(present: bool) is called on every presence change."""
+        self.listeners.append(callback)
+
+    def motion_fraction(self, frame) -> float:
+        """Fraction of pixels that differ from the background; also updates the background."""
+        if self._background is None:
+            self._background = frame.astype(np.float32)
+            return 0.0
+        np.subtract(frame, self._background, out=self._diff, dtype=np.float32)
+        np.abs(self._diff, out=self._diff)
+        np.greater(self._diff, self.threshold, out=self._mask)
+        fraction = np.count_nonzero(self._mask) / self._mask.size
+        # background += alpha * (frame - background), in place
+        self._background *= 1.0 - self.alpha
+        self._background += self.alpha * frame
+        return fraction
+
+    def feed(self, frame, now: float) -> bool | None:
+        """Process one frame. Returns the new state if presence changed, else None."""
+        if frame.shape != self.shape:
+            frame = downsample(frame, *self.shape)
+        with self._lock:
+            if self.last_motion is None:
+                self.last_motion = now
+            if self.motion_fraction(frame) >= self.min_fraction:
+                self.last_motion = now
+                if not self.present:
+                    return self._set_present(True)
+            elif self.present and now - self.last_motion >= self.absent_after:
+                return self._set_present(False)
+            return None
+
+    def reset(self) -> None:
+        """Forget the background and the last motion time (after capture was paused)."""
+        with self._lock:
+            self._background = None
+            self.last_motion = None
+
+    def mark_present(self) -> None:
+        """Presence known from elsewhere (e.g. a button press): report it if the detector missed it."""
+        with self._lock:
+            self.last_motion = None
+            if not self.present:
+                self._set_present(True)
+
+    def _set_present(self, present: bool) -> bool:
+        """Record and report a change. Callers hold self._lock."""
+        self.present = present
+        log.info("Presence: %s", "dog nearby" if present else "nobody there")
+        for cb in self.listeners:
+            try:
+                cb(present)
+            except Exception as e:
+                log.warning("Presence listener failed: %s", e)
+        return present
+
+
+def downsample(frame, height: int, width: int):
+    """Block-average a 2D (or HxWxC) frame down to (height, width) uint8 grayscale."""
+    frame = np.asarray(frame)
+    if frame.ndim == 3:
+        frame = frame[..., :3].mean(axis=2)
+    fy = max(1, frame.shape[0] // height)
+    fx = max(1, frame.shape[1] // width)
+    if frame.shape[0] < height or frame.shape[1] < width:
+        # Too small to block-average: nearest-neighbour upscale
+        ys = np.arange(height) * frame.shape[0] // height
+        xs = np.arange(width) * frame.shape[1] // width
+        return frame[ys[:, None], xs].astype(np.uint8)
+    cropped = frame[: height * fy, : width * fx]
+    blocks = cropped.reshape(height, fy, width, fx).mean(axis=(1, 3))
+    return blocks.astype(np.uint8)
+
+
+def _ffmpeg_cmd(source: str, width: int, height: int, fps: float, single: bool = False) -> list:
+    cmd = ["ffmpeg", "-loglevel", "error", "-nostdin"]
+    if source.startswith("/dev/video"):
+        cmd += ["-f", "v4l2", "-framerate", "5"]
+    cmd += ["-i", source]
+    if single:
+        cmd += ["-frames:v", "1", "-vf", f"scale={width}:{height},format=gray"]
+    else:
+        cmd += ["-vf", f"fps={fps},scale={width}:{height},format=gray"]
+    return cmd + ["-f", "rawvideo", "-pix_fmt", "gray", "-"]
+
+
+def ffmpeg_frames(source: str, width: int = FRAME_WIDTH, height: int = FRAME_HEIGHT, fps: float = 2.0):
+    """Yield (height, width) uint8 frames from a camera device or video file via ffmpeg.
+
+    For a camera device, yields nothing while the camera is released for a call and
+    stops when release_camera() kills ffmpeg.
+    """
+    global _camera_proc
+    size = width * height
+    capture = is_capture_device(source)
+    with _camera_lock:
+        if capture and not _camera_free.is_set():
+            return
+        proc = subprocess.Popen(
+            _ffmpeg_cmd(source, width, height, fps),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        if capture:
+            _camera_proc = proc
+    try:
+        while True:
+            buf = proc.stdout.read(size)
+            if len(buf) < size:
+                break
+            yield np.frombuffer(buf, dtype=np.uint8).reshape(height, width)
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def _read_pgm(path: Path):
+    """Read a binary (P5) PGM file into a uint8/uint16 array."""
+    data = path.read_bytes()
+    fields = []
+    pos = 0
+    while len(fields) < 4:
+        # Skip whitespace and comments between header fields
+        while data[pos:pos + 1].isspace():
+            pos += 1
+        if data[pos:pos + 1] == b"#":
+            pos = data.index(b"\n", pos) + 1
+            continue
+        start = pos
+        while not data[pos:pos + 1].isspace():
+            pos += 1
+        fields.append(data[start:pos])
+    if fields[0] != b"P5":
+        raise ValueError(f"{path.name}: only binary PGM (P5) is supported")
+    w, h, maxval = int(fields[1]), int(fields[2]), int(fields[3])
+    dtype = np.uint8 if maxval < 256 else np.dtype(">u2")
+    pixels = np.frombuffer(data, dtype=dtype, count=w * h, offset=pos + 1).reshape(h, w)
+    if maxval >= 256:
+        pixels = (pixels >> 8).astype(np.uint8)
+    return pixels
+
+
+def directory_frames(path: str, width: int = FRAME_WIDTH, height: int = FRAME_HEIGHT):
+    """Yield frames from image files in a directory, in name order."""
+    files = sorted(p for p in Path(path).iterdir() if p.suffix.lower() in FRAME_EXTS)
+    for p in files:
+        ext = p.suffix.lower()
+        try:
+            if ext == ".npy":
+                frame = np.load(p)
+            elif ext == ".pgm":
+                frame = _read_pgm(p)
+            else:
+                out = subprocess.run(
+                    _ffmpeg_cmd(str(p), width, height, 0, single=True),
+                    capture_output=True,
+                    timeout=10,
+                ).stdout
+                frame = np.frombuffer(out[: width * height], dtype=np.uint8).reshape(height, width)
+        except Exception as e:
+            log.warning("Skipping frame %s: %s", p.name, e)
+            continue
+        yield downsample(frame, height, width)
+
+
+def open_frames(source: str, width: int = FRAME_WIDTH, height: int = FRAME_HEIGHT, fps: float = 2.0):
+    """Frames from a directory, video file or camera device (e.g. /dev/video0)."""
+    if Path(source).is_dir():
+        return directory_frames(source, width, height)
+    return ffmpeg_frames(source, width, height, fps)
+
+
+def run_detector(detector: PresenceDetector, frames, fps: float = 2.0, realtime: bool = True) -> None:
+    """Feed frames to detector. With realtime=False, timestamps are frame_index / fps (for recorded input)."""
+    for i, frame in enumerate(frames):
+        now = time.monotonic() if realtime else i / fps
+        detector.feed(frame, now)
+
+
+def start_presence_thread(cfg: dict, listeners) -> PresenceDetector | None:
+    """Start presence detection on PRESENCE_SOURCE in a background thread (if configured)."""
+    source = cfg.get("presence_source")
+    if not source:
+        return None
+    if not HAS_NUMPY:
+        log.warning("Presence detection needs numpy: pip install numpy")
+        return None
+    fps = cfg.get("presence_fps", 2.0)
+    detector = PresenceDetector(absent_after=cfg.get("presence_absent_secs", 120.0))
+    for cb in listeners:
+        detector.add_listener(cb)
+
+    def loop():
+        # Restart the source if it ends (camera unplugged, ffmpeg crashed)
+        while True:
+            _camera_free.wait()
+            try:
+                run_detector(detector, open_frames(source, fps=fps), fps)
+            except Exception as e:
+                log.warning("Presence source %s failed: %s", source, e)
+            if not _camera_free.is_set():
+                # Released for a call: start with a fresh background when the camera is back
+                detector.reset()
+                continue
+            time.sleep(10)
+
+    t = threading.Thread(target=loop, daemon=True)
+    t.start()
+    log.info("Presence detection on %s (%.1f fps)", source, fps)
+    return detector
+
+
+def main() -> None:
+    import argparse
+    parser = argparse.ArgumentParser(description="Run presence detection on recorded frames and print events.")
+    parser.add_argument("source", help="Directory of frames, video file, or camera device")
+    parser.add_argument("--fps", type=float, default=2.0, help="Frames per second (timestamps for recorded input)")
+    parser.add_argument("--absent-after", type=float, default=120.0, help="Seconds without motion before 'absent'")
+    parser.add_argument("--threshold", type=float, default=18.0, help="Per-pixel difference threshold (0-255)")
+    parser.add_argument("--min-fraction", type=float, default=0.02, help="Fraction of changed pixels that counts as motion")
+    args = parser.parse_args()
+    if not HAS_NUMPY:
+        print("Install numpy: pip install numpy", file=sys.stderr)
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    detector = PresenceDetector(
+        threshold=args.threshold,
+        min_fraction=args.min_fraction,
+        absent_after=args.absent_after,
+    )
+    live = args.source.startswith("/dev/video")
+    frames = open_frames(args.source, fps=args.fps)
+    for i, frame in enumerate(frames):
+        now = time.monotonic() if live else i / args.fps
+        changed = detector.feed(frame, now)
+        if changed is not None:
+            print(f"{now:8.1f}s  {'present' if changed else 'absent'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,7 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
 from config import load_config
+from diagnostics import register_debug_routes
 
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 log = logging.getLogger("setup")
@@ -124,7 +125,8 @@ def connect_wifi(ssid: str, password: str) -> bool:
     return False
 
 
-def create_app():
+def create_app(queue_update=None):
+    """Setup wizard app. queue_update() defers a git pull until the internet is back (the launcher passes its own)."""
     app = Flask(__name__)
 
     @app.route("/")
@@ -143,7 +145,7 @@ def create_app():
     def has_internet() -> bool:
         try:
             import urllib.request
-            urllib.request.urlopen("https://api.telegram.org", timeout=3)
+            urllib.request.urlopen(load_config()["internet_probe_url"], timeout=3)
             return True
         except Exception:
             return False
@@ -217,6 +219,10 @@ def create_app():
     @app.route("/api/update", methods=["POST"])
     def api_update():
         """Pull latest from GitHub (https://github.com/TimothyFsr/Dogphone)."""
+        if queue_update is not None and not has_internet():
+            # Setup mode is usually offline: pull once the network is back instead of failing now
+            queue_update()
+            return jsonify({"ok": True, "queued": True, "message": "Offline; update queued."})
         try:
             from update_check import run_update
             ok, msg = run_update()
@@ -237,6 +243,7 @@ def create_app():
             pass
         return jsonify({"ok": True, "reboot": True})
 
+    register_debug_routes(app, load_config().get("debug_token", ""))
     return app
 
 